@@ -1,7 +1,9 @@
+import json
+
 import pytest
 
 from tests.conftest import find_talespire_path
-from ts_encoding import assets
+from ts_encoding import InvalidAssetIndex, assets
 
 # These tests should ensure that the index.json data stays consistent.
 TEST_CASES = [
@@ -60,4 +62,165 @@ def test_asset_dict(input_data):
     global LIBRARY
     if LIBRARY is None:
         pytest.skip("Library not loaded")
-    assert_data(LIBRARY.asset(input_data["uuid"]).asset_dict, input_data["assert"])
\ No newline at end of file
+    assert_data(LIBRARY.asset(input_data["uuid"]).asset_dict, input_data["assert"])
+
+
+def write_index(path, name, tiles, props=()):
+    # Write a minimal index.json with the fields the asset library reads.
+    def entry(asset_id, asset_name, icon):
+        asset_dict = {"Id": asset_id, "Name": asset_name, "IsDeprecated": 0}
+        if icon:
+            asset_dict["Icon"] = {"AtlasIndex": 0, "Region": {"x": 0.0, "y": 0.5, "width": 0.25, "height": 0.25}}
+        return asset_dict
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index_dict = {
+        "Name": name,
+        "IconsAtlases": [{"Path": "Icons/atlas0.png"}],
+        "Tiles": [entry(asset_id, asset_name, True) for asset_id, asset_name in tiles],
+        "Props": [entry(asset_id, asset_name, False) for asset_id, asset_name in props],
+        "Creatures": [],
+        "Music": [],
+    }
+    path.write_text(json.dumps(index_dict), encoding="utf-8")
+
+
+@pytest.fixture
+def fake_talespire_path(tmp_path):
+    base_path = tmp_path / "TaleSpire"
+    write_index(base_path / "Taleweaver/pack_a/index.json", "Pack A",
+                [("01C3A210-94FB-449F-8C47-993EDA3E7126", "Grass - Lush")],
+                [("6a6e7bd3-8f9a-4d8b-a4d2-1e6c4c2bb0a1", "Torch")])
+    write_index(base_path / "Taleweaver/pack_b/index.json", "Pack B",
+                [("2b3c4d5e-0000-4000-8000-000000000001", "Stone Wall")])
+    return base_path
+
+
+def test_library_cache(fake_talespire_path, tmp_path, monkeypatch):
+    # Test that a warm library only reads the index files that changed.
+    cache_path = tmp_path / "cache/assets.json"
+    library = assets.TSAssetLib(fake_talespire_path, use_cache=True, cache_path=cache_path)
+    assert cache_path.exists()
+    grass = library.asset("01c3a210-94fb-449f-8c47-993eda3e7126")
+    assert grass.name == "Grass - Lush"
+    assert grass.atlas_region == (0.0, 0.5, 0.25, 0.25)
+    assert grass.icon_atlas == str(fake_talespire_path / "Taleweaver/pack_a/Icons/atlas0.png")
+    assert grass.asset_dict["Id"] == "01C3A210-94FB-449F-8C47-993EDA3E7126"
+    assert library.asset("6a6e7bd3-8f9a-4d8b-a4d2-1e6c4c2bb0a1").name == "Torch"
+
+    read_packs = []
+    read_asset_pack = assets.read_asset_pack
+    monkeypatch.setattr(assets, "read_asset_pack", lambda path: read_packs.append(path) or read_asset_pack(path))
+    warm_library = assets.TSAssetLib(fake_talespire_path, use_cache=True, cache_path=cache_path)
+    assert read_packs == []
+    assert [asset.id for asset in warm_library.assets()] == [asset.id for asset in library.assets()]
+
+    pack_b = fake_talespire_path / "Taleweaver/pack_b/index.json"
+    write_index(pack_b, "Pack B", [("2b3c4d5e-0000-4000-8000-000000000001", "Stone Wall - Mossy")])
+    changed_library = assets.TSAssetLib(fake_talespire_path, use_cache=True, cache_path=cache_path)
+    assert read_packs == [pack_b]
+    assert changed_library.asset("2b3c4d5e-0000-4000-8000-000000000001").name == "Stone Wall - Mossy"
+
+    assets.TSAssetLib(fake_talespire_path, use_cache=False)
+    assert len(read_packs) == 3
+
+    # The cache file is only written when it is asked for.
+    monkeypatch.delenv("LOCALAPPDATA", raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+    assets.TSAssetLib(fake_talespire_path)
+    assert not assets.default_cache_path().exists()
+
+
+@pytest.mark.parametrize("workers, use_processes", [(1, False), (4, False), (2, True)])
+def test_concurrent_index_loading(fake_talespire_path, workers, use_processes):
+    # Test that loading the index files concurrently keeps the order and reports the file that failed.
+    index_dicts = assets.get_index_dicts(fake_talespire_path, workers, use_processes)
+    assert list(index_dicts) == ["Pack A", "Pack B"]
+    library = assets.TSAssetLib(fake_talespire_path, use_cache=False, workers=workers, use_processes=use_processes)
+    assert [asset.name for asset in library.assets()] == ["Grass - Lush", "Torch", "Stone Wall"]
+
+    bad_index = fake_talespire_path / "Taleweaver/pack_b/index.json"
+    bad_index.write_text("{", encoding="utf-8")
+    with pytest.raises(InvalidAssetIndex) as exc_info:
+        assets.get_index_dicts(fake_talespire_path, workers, use_processes)
+    assert exc_info.value.path == str(bad_index)
+    assert isinstance(exc_info.value.__cause__, ValueError)  # The parse error, also from a worker process.
+    with pytest.raises(InvalidAssetIndex):
+        assets.TSAssetLib(fake_talespire_path, use_cache=False, workers=workers, use_processes=use_processes)
+
+
+def test_lazy_library(fake_talespire_path, tmp_path):
+    # Test that a lazy library only creates the assets that are used and matches an eager library.
+    library = assets.TSAssetLib(fake_talespire_path, use_cache=True, cache_path=tmp_path / "assets.json")
+    lazy_library = assets.TSAssetLib(fake_talespire_path, use_cache=True, cache_path=tmp_path / "assets.json",
+                                      lazy=True)
+    assert lazy_library._asset_uuid_dict == {}
+
+    torch = lazy_library.asset("6a6e7bd3-8f9a-4d8b-a4d2-1e6c4c2bb0a1")
+    assert torch.name == "Torch"
+    assert lazy_library.asset("6a6e7bd3-8f9a-4d8b-a4d2-1e6c4c2bb0a1") is torch
+    assert lazy_library.asset("00000000-0000-0000-0000-000000000000") is None
+    assert list(lazy_library._asset_uuid_dict) == [torch.id]
+
+    assert [asset.id for asset in lazy_library.assets()] == [asset.id for asset in library.assets()]
+    assert lazy_library.asset_uuid_dict[torch.id] is torch
+    grass = lazy_library.asset("01c3a210-94fb-449f-8c47-993eda3e7126")
+    assert grass.icon_atlas == library.asset(grass.id).icon_atlas
+
+
+def test_asset_from_index_entry():
+    # Test that assets can still be created from an index entry.
+    entry = {"Id": "01C3A210-94FB-449F-8C47-993EDA3E7126", "Name": "Grass - Lush", "IsDeprecated": 0,
+             "Icon": {"AtlasIndex": 1, "Region": {"x": 0.0, "y": 0.5, "width": 0.25, "height": 0.25}}}
+    grass = assets.TSIconAsset(entry, "Tiles")
+    assert (grass.id, grass.name, grass.deprecated) == ("01c3a210-94fb-449f-8c47-993eda3e7126", "Grass - Lush", False)
+    assert (grass.icon_atlas_index, grass.atlas_region) == (1, (0.0, 0.5, 0.25, 0.25))
+    assert grass.asset_dict is entry
+    assert assets.TSAsset(entry, "Tiles").asset_dict is entry
+
+
+def test_compact_assets(fake_talespire_path, monkeypatch):
+    # Test that the assets only store their fields and read each index file once when asked for an entry.
+    library = assets.TSAssetLib(fake_talespire_path, use_cache=False)
+    read_files = []
+    read_index_file = assets.read_index_file
+    monkeypatch.setattr(assets, "read_index_file", lambda path: read_files.append(path) or read_index_file(path))
+    grass = library.asset("01c3a210-94fb-449f-8c47-993eda3e7126")
+    assert not hasattr(grass, "__dict__")
+    assert (grass.name, grass.asset_type, grass.deprecated) == ("Grass - Lush", "Tiles", False)
+    assert (grass.icon_atlas_index, grass.atlas_region) == (0, (0.0, 0.5, 0.25, 0.25))
+    assert grass.asset_dict["Icon"]["AtlasIndex"] == 0
+    assert library.asset("6a6e7bd3-8f9a-4d8b-a4d2-1e6c4c2bb0a1").asset_dict["Name"] == "Torch"
+    assert grass.asset_dict["Name"] == "Grass - Lush"
+    assert len(read_files) == 1
+    stone = library.asset("2b3c4d5e-0000-4000-8000-000000000001")
+    assert (stone.asset_dict["Name"], grass.asset_dict["Name"]) == ("Stone Wall", "Grass - Lush")
+    assert len(read_files) == 2
+
+    # Only the entries of the index files used last are kept.
+    entries = assets._IndexEntries(maxsize=1)
+    for asset in (grass, stone, grass):
+        assert entries.get(asset.index_path, asset.asset_type, asset.id)["Name"] == asset.name
+    assert len(read_files) == 5
+
+
+def test_search(fake_talespire_path):
+    # Test that names are found by the start or any part of their words and ranked best match first.
+    write_index(fake_talespire_path / "Taleweaver/pack_c/index.json", "Pack C",
+                [("00000000-0000-4000-8000-000000000001", "Wall of Stone"),
+                 ("00000000-0000-4000-8000-000000000002", "Cobblestone Wall")],
+                [("00000000-0000-4000-8000-000000000003", "Wall Torch")])
+    library = assets.TSAssetLib(fake_talespire_path, use_cache=False, lazy=True)
+
+    def names(*args, **kwargs):
+        return [asset.name for asset in library.search(*args, **kwargs)]
+
+    assert names("stone wall") == ["Stone Wall", "Wall of Stone", "Cobblestone Wall"]
+    assert names("Wall") == ["Wall Torch", "Wall of Stone", "Stone Wall", "Cobblestone Wall"]
+    assert names("wall", limit=2) == ["Wall Torch", "Wall of Stone"]
+    assert names("torch") == ["Torch", "Wall Torch"]
+    assert names("torch", asset_types=["tiles"]) == []
+    assert names("ston") == ["Stone Wall", "Wall of Stone", "Cobblestone Wall"]
+    assert names("blest") == ["Cobblestone Wall"]
+    assert names("stone brick") == []
+    assert names("  ") == []
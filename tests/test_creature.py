@@ -1,5 +1,6 @@
 import pytest
-from ts_encoding.creature_bp import TSCreature
+from ts_encoding.common import UUID_CACHE
+from ts_encoding.creature_bp import TSCreature, decode_blueprints, encode_blueprints
 
 # Blueprint v1 samples are from the 5e Database
 #  https://talestavern.com/talespire-5e-creature-blueprint-database-2/
@@ -113,3 +114,36 @@ def test_encode(input_data):
     bp.decode_url(original_url)
     new_url = bp.encode_url()
     assert new_url == original_url
+
+
+def test_batch():
+    # Test that batch decoding and encoding keep the order and return errors in place.
+    urls = [test_case.values[0]["url"] for test_case in TEST_CASES]
+    urls.insert(1, "talespire://creature-blueprint/AQ")
+    results = decode_blueprints(urls, workers=2)
+
+    assert isinstance(results.pop(1), ValueError)
+    for data, test_case in zip(results, TEST_CASES):
+        assert_data(data, test_case.values[0]["assert"])
+
+    urls.pop(1)
+    assert encode_blueprints(results, workers=2) == urls
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_decode_buffer(input_data):
+    # Test that a URL in a buffer-protocol object decodes the same as a string.
+    bp = TSCreature()
+    bp.decode_url(memoryview(input_data["url"].encode("ascii")))
+    assert_data(bp.data, input_data["assert"])
+
+
+def test_uuid_cache():
+    # Test that the morph UUIDs go through the shared UUID cache.
+    urls = [case.values[0]["url"] for case in TEST_CASES]
+    for url in urls:
+        TSCreature().decode_url(url)
+    hits = UUID_CACHE.hits
+    for url in urls:
+        TSCreature().decode_url(url)
+    assert UUID_CACHE.hits > hits
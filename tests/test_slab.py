@@ -1,6 +1,13 @@
+import base64
+import gzip
+import mmap
+import pickle
+
 import pytest
 
-from ts_encoding.slab import TSSlab
+from ts_encoding import BadSlabCode, SlabExceedsSizeLimit, SlabPatchConflict, SlabPositionOutOfRange
+from ts_encoding.common import UUID_CACHE
+from ts_encoding.slab import TSSlab, TSSlabLayout, TSSlabPatch, decode_slabs, diff_slabs
 
 TEST_CASES = [
     pytest.param(
@@ -63,3 +70,541 @@ def test_encode(input_data):
     new_slab = TSSlab()
     new_slab.decode_slab(new_slab_code)
     assert_data(new_slab.data, input_data["assert"])
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_decode_numpy(input_data):
+    # Test that the vectorized NumPy decoding matches the standard decoding exactly.
+    pytest.importorskip("numpy")
+    slab = TSSlab()
+    slab.decode_slab(input_data["slab_code"])
+
+    np_slab = TSSlab(use_numpy=True)
+    np_slab.decode_slab(input_data["slab_code"])
+    assert np_slab.data == slab.data
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_encode_numpy(input_data):
+    # Test that the vectorized NumPy encoding results in the same data as the standard encoding.
+    pytest.importorskip("numpy")
+    slab = TSSlab()
+    slab.decode_slab(input_data["slab_code"])
+    slab.encode_slab(force_version=2)
+
+    np_slab = TSSlab(use_numpy=True)
+    np_slab.decode_slab(input_data["slab_code"])
+    np_slab.encode_slab(force_version=2)
+    assert gzip.decompress(np_slab._binary_data) == gzip.decompress(slab._binary_data)
+
+
+def test_columnar_layouts():
+    # Test that the columnar layouts are used without building the data dictionary until it is accessed.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[0].values[0]["slab_code"])
+    slab.encode_slab()
+    assert slab._data is None
+    assert len(slab.layouts[0]) == 9
+    assert slab.layouts[0].instance(0) == {"degrees": 90.0, "pos_x": 4.0, "pos_y": 0.0, "pos_z": 0.0}
+
+    # Edits to the data dictionary are encoded.
+    slab.data["layouts"][0]["instances"].pop()
+    new_slab = TSSlab()
+    new_slab.decode_slab(slab.encode_slab())
+    assert len(new_slab.layouts[0]) == 8
+
+    # Edits to the layouts after the dictionary was built are encoded too.
+    new_slab.data
+    new_slab.layouts[0].pos_x[0] = 7.0
+    new_slab.layouts[0].append(1.0, 0.0, 2.0, 0.0)
+    assert new_slab.data["layouts"][0]["instances"][0]["pos_x"] == 7.0
+    slab.decode_slab(new_slab.encode_slab())
+    assert len(slab.layouts[0]) == 9
+    assert slab.layouts[0].pos_x[0] == 7.0
+
+    new_slab.data["layouts"][0]["instances"].pop()
+    new_slab.layouts[0].pos_x[0] = 8.0
+    with pytest.raises(ValueError):
+        new_slab.encode_slab()
+
+
+def test_data_edits(monkeypatch):
+    # Test that an unedited data dictionary is not compared again and that edits made in any way are found.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    data = slab.data
+    rebuilt = []
+    from_dict = TSSlabLayout.from_dict
+    monkeypatch.setattr(TSSlabLayout, "from_dict", staticmethod(lambda layout: rebuilt.append(1) or from_dict(layout)))
+    for _ in range(3):
+        assert slab.data is data
+        slab.encode_slab()
+        slab.spatial_index()
+    assert not rebuilt
+
+    data["layouts"][0]["instances"][0]["pos_x"] += 1.0
+    slab.encode_slab()
+    assert rebuilt and slab.layouts[0].pos_x[0] == data["layouts"][0]["instances"][0]["pos_x"]
+    rebuilt.clear()
+    slab.encode_slab()
+    assert not rebuilt
+
+    slab.layouts[0].pos_x[0] = 3.0
+    assert slab.data["layouts"][0]["instances"][0]["pos_x"] == 3.0
+
+    copied = pickle.loads(pickle.dumps(slab))
+    copied.data["layouts"][0]["instances"][0]["pos_x"] = 5.0
+    assert copied.packed_transforms() and copied.layouts[0].pos_x[0] == 5.0
+
+    # A dictionary added by the caller does not record its edits, the data is compared from then on.
+    instance = dict(slab.data["layouts"][0]["instances"][0])
+    slab.data["layouts"][0]["instances"].append(instance)
+    slab.encode_slab()
+    instance["pos_x"] = 6.0
+    slab.encode_slab()
+    assert slab.layouts[0].pos_x[-1] == 6.0
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_iter_instances(input_data):
+    # Test that iterating the instances yields the same instances as a full decode.
+    slab = TSSlab()
+    slab.decode_slab(input_data["slab_code"])
+    expected = [
+        (layout["uuid"], data["pos_x"], data["pos_y"], data["pos_z"], data["degrees"])
+        for layout in slab.data["layouts"] for data in layout["instances"]
+    ]
+    assert list(slab.iter_instances(input_data["slab_code"])) == expected
+    assert slab.data["layouts"][0]["instances"]  # The decoded slab is not changed.
+
+    # Data cut short on an instance boundary is an error, not fewer instances.
+    data = gzip.decompress(base64.b64decode(input_data["slab_code"]))
+    truncated = base64.b64encode(gzip.compress(data[:-slab._instance_size()]))
+    with pytest.raises(BadSlabCode):
+        slab.iter_instances(truncated)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_decode_truncated(input_data, use_numpy):
+    # Test that a slab cut short on an instance boundary does not decode to fewer instances.
+    if use_numpy:
+        pytest.importorskip("numpy")
+    slab = TSSlab(use_numpy=use_numpy)
+    slab.decode_slab(input_data["slab_code"])
+    data = gzip.decompress(base64.b64decode(input_data["slab_code"]))
+    truncated = base64.b64encode(gzip.compress(data[:slab._offset - 2 * slab._instance_size()]))
+    with pytest.raises(BadSlabCode):
+        slab.decode_slab(truncated)
+
+
+def test_decode_slabs():
+    # Test that batch decoding keeps the order and returns errors in place.
+    slab_codes = [test_case.values[0]["slab_code"] for test_case in TEST_CASES]
+    slab_codes.insert(1, "H4sIAAAAAAAACg==")
+    slab_codes.insert(2, "H4sIAAAAAAAAC\u00e9==")
+    results = decode_slabs(slab_codes, workers=2)
+
+    assert isinstance(results[1], BadSlabCode)
+    assert isinstance(results[2], BadSlabCode)
+    for slab, test_case in zip([results[0], results[3]], TEST_CASES):
+        assert_data(slab.data, test_case.values[0]["assert"])
+
+
+def test_decode_buffer(tmp_path):
+    # Test that slabs decode from buffer-protocol objects, including a memory mapped file.
+    slab_code = TEST_CASES[1].values[0]["slab_code"]
+    slab_file = tmp_path / "slab.txt"
+    slab_file.write_text(slab_code)
+
+    with slab_file.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for buffer in [slab_code.encode(), bytearray(slab_code.encode()), memoryview(slab_code.encode()), mapped]:
+            slab = TSSlab()
+            slab.decode_slab(buffer)
+            assert_data(slab.data, TEST_CASES[1].values[0]["assert"])
+            assert pickle.loads(pickle.dumps(slab)).data == slab.data
+
+    # The slab does not hold on to the mapped file once it is decoded.
+    slab = TSSlab()
+    with slab_file.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        slab.decode_slab(mapped)
+        mapped.close()
+    assert pickle.loads(pickle.dumps(slab)).data == slab.data
+
+
+def test_encode_round_trip():
+    # Test that decoded positions encode back to the same packed positions, 0.29 * 100 truncates to 28.
+    slab = TSSlab()
+    slab.data["layouts"].append({
+        "uuid": "01c3a210-94fb-449f-8c47-993eda3e7126",
+        "instances": [{"degrees": 15.0, "pos_x": 0.29, "pos_y": 0.57, "pos_z": 1.13}]
+    })
+    new_slab = TSSlab()
+    new_slab.decode_slab(slab.encode_slab())
+    assert new_slab.layouts[0].instance(0) == {"degrees": 15.0, "pos_x": 0.29, "pos_y": 0.57, "pos_z": 1.13}
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_packed_transform_rounding(use_numpy):
+    # Test that positions are rounded to the nearest 0.01 when packed, halves round to even like round().
+    if use_numpy:
+        pytest.importorskip("numpy")
+    slab = TSSlab(use_numpy=use_numpy)
+    layout = TSSlabLayout("01c3a210-94fb-449f-8c47-993eda3e7126")
+    layout.append(0.29, 0.57, 1.13, 15.0)
+    layout.append(0.125, 0.135, 0.004, 359.0)
+    slab.layouts.append(layout)
+    assert list(slab.packed_transforms()[0]) == [
+        (1 << 54) | (113 << 36) | (57 << 18) | 29,
+        (23 << 54) | (0 << 36) | (14 << 18) | 12,
+    ]
+
+
+def test_encode_slab_split():
+    # Test that splitting a slab keeps every instance and each slab fits the size limit.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    expected = sorted(
+        (layout.uuid, transform)
+        for layout, packed in zip(slab.layouts, slab.packed_transforms()) for transform in packed
+    )
+
+    split_slabs = slab.encode_slab_split(size_limit=256)
+    assert len(split_slabs) > 1
+
+    instances = []
+    for slab_code, (offset_x, offset_y, offset_z) in split_slabs:
+        assert len(base64.b64decode(slab_code)) <= 256
+        split_slab = TSSlab()
+        split_slab.decode_slab(slab_code)
+        shift = (round(offset_z * 100) << 36) | (round(offset_y * 100) << 18) | round(offset_x * 100)
+        for layout, packed in zip(split_slab.layouts, split_slab.packed_transforms()):
+            instances.extend((layout.uuid, transform + shift) for transform in packed)
+    assert sorted(instances) == expected
+
+
+@pytest.mark.parametrize("compression", ["fast", "default", "max", 0])
+def test_encode_compression(compression):
+    # Test that every compression profile encodes the same slab and reports its size.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    slab_code, size = slab.encode_slab_with_size(compression=compression)
+    assert size == len(base64.b64decode(slab_code))
+
+    new_slab = TSSlab()
+    new_slab.decode_slab(slab_code)
+    assert new_slab.data == slab.data
+
+
+def test_size_limit_at_max_compression(monkeypatch):
+    # Test that the size limit is checked at max compression, a fast preview of a slab that fits does not raise.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    max_size = slab.encode_slab_with_size(force_version=2)[1]
+    fast_size = slab.encode_slab_with_size(compression=1)[1]
+    assert fast_size > max_size
+
+    monkeypatch.setattr("ts_encoding.slab.SLAB_SIZE_LIMIT", max_size)
+    assert slab.encode_slab_with_size(compression="fast")[1] == fast_size
+    monkeypatch.setattr("ts_encoding.slab.SLAB_SIZE_LIMIT", max_size - 1)
+    with pytest.raises(SlabExceedsSizeLimit):
+        slab.encode_slab(compression="fast")
+
+
+def test_encode_sort_instances():
+    # Test that sorting the instances keeps every instance in its layout and does not grow the slab.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    slab_code, size = slab.encode_slab_with_size(force_version=2)
+    sorted_code, sorted_size = slab.encode_slab_with_size(force_version=2, sort_instances=True)
+    assert sorted_size <= size
+
+    new_slab = TSSlab()
+    new_slab.decode_slab(slab_code)
+    sorted_slab = TSSlab()
+    sorted_slab.decode_slab(sorted_code)
+    for layout, sorted_layout in zip(new_slab.data["layouts"], sorted_slab.data["layouts"]):
+        assert layout["uuid"] == sorted_layout["uuid"]
+        key = lambda instance: sorted(instance.items())
+        assert sorted(layout["instances"], key=key) == sorted(sorted_layout["instances"], key=key)
+
+    pytest.importorskip("numpy")
+    np_slab = TSSlab(use_numpy=True)
+    np_slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    np_sorted_code = np_slab.encode_slab(force_version=2, sort_instances=True)
+    assert gzip.decompress(base64.b64decode(np_sorted_code)) == gzip.decompress(base64.b64decode(sorted_code))
+
+
+def test_uuid_cache():
+    # Test that repeated layout UUIDs are found in the cache and the same string object is reused.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    hits = UUID_CACHE.hits
+
+    new_slab = TSSlab()
+    new_slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    assert UUID_CACHE.hits > hits
+    assert all(new.uuid is old.uuid for new, old in zip(new_slab.layouts, slab.layouts))
+
+    hits = UUID_CACHE.hits
+    new_slab.encode_slab()
+    new_slab.encode_slab(compression="fast")
+    assert UUID_CACHE.hits > hits
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_decode_slab_header(input_data):
+    # Test that a header-only decode returns the same layouts as a full decode.
+    slab = TSSlab()
+    slab.decode_slab(input_data["slab_code"])
+    header = TSSlab().decode_slab_header(input_data["slab_code"])
+    assert header["version"] == slab.data["version"]
+    assert header["num_creatures"] == slab.data["num_creatures"]
+    assert header["layout_count"] == slab.data["layout_count"]
+    assert header["layouts"] == [
+        {key: layout[key] for key in ("uuid", "instance_count", "reserved")} for layout in slab.data["layouts"]
+    ]
+
+    with pytest.raises(BadSlabCode):
+        TSSlab().decode_slab_header(input_data["slab_code"][:16])
+
+    # A header decode leaves a decoded slab as it is.
+    data = slab.data
+    slab.decode_slab_header(input_data["slab_code"])
+    assert slab.data is data and slab.layouts[0].instance(0) == data["layouts"][0]["instances"][0]
+
+
+def test_decode_slab_header_buffer(tmp_path):
+    # Test that the caller's memory mapped file can be closed after a header decode.
+    slab_file = tmp_path / "slab.txt"
+    slab_file.write_text(TEST_CASES[1].values[0]["slab_code"])
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    with slab_file.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        slab.decode_slab_header(mapped)
+        mapped.close()
+    assert slab.read_instance(0, 0) == slab.layouts[0].instance(0)
+
+
+@pytest.mark.parametrize("input_data", TEST_CASES)
+def test_decode_selected_layouts(input_data):
+    # Test that decoding chosen layouts and reading single instances matches a full decode.
+    slab = TSSlab()
+    slab.decode_slab(input_data["slab_code"])
+    chosen = [layout for n, layout in enumerate(slab.data["layouts"]) if n % 2 == 1]
+
+    selected_slab = TSSlab()
+    selected_slab.decode_slab(input_data["slab_code"], uuids=[layout["uuid"].upper() for layout in chosen])
+    assert selected_slab.data["layouts"] == chosen
+    assert selected_slab.data["num_creatures"] == slab.data["num_creatures"]
+
+    header_slab = TSSlab()
+    header_slab.decode_slab_header(input_data["slab_code"])
+    for n, layout in reversed(list(enumerate(slab.data["layouts"]))):
+        assert header_slab.read_instance(n, layout["instance_count"] - 1) == layout["instances"][-1]
+        assert header_slab.read_instance(layout["uuid"], 0) == layout["instances"][0]
+    with pytest.raises(IndexError):
+        header_slab.read_instance(0, slab.data["layouts"][0]["instance_count"])
+    with pytest.raises(ValueError):
+        slab.read_instance(0, 0)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_transforms(use_numpy):
+    # Test that translating, rotating and mirroring moves the instances and can be undone.
+    if use_numpy:
+        pytest.importorskip("numpy")
+    slab = TSSlab(use_numpy=use_numpy)
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    original = slab.encode_slab(force_version=2)
+    slab.decode_slab(original)
+    layout = slab.layouts[0]
+    x, y, z, degrees = layout.pos_x[0], layout.pos_y[0], layout.pos_z[0], layout.degrees[0]
+
+    slab.translate(10.0, 0.5, 20.0)
+    assert slab.data["layouts"][0]["instances"][0]["pos_x"] == pytest.approx(x + 10.0)
+    slab.translate(-10.0, -0.5, -20.0)
+
+    slab.rotate(6, center=(x, z))
+    instance = slab.data["layouts"][0]["instances"][0]
+    assert (instance["pos_x"], instance["pos_z"]) == pytest.approx((x, z))
+    assert instance["degrees"] == (degrees + 90.0) % 360.0
+    slab.rotate(1, center=(x, z))
+    slab.rotate(-7, center=(x, z))
+    assert slab.encode_slab(force_version=2) == original
+
+    slab.mirror("x")
+    assert slab.layouts[0].degrees[0] == (360.0 - degrees) % 360.0
+    slab.mirror("x")
+    slab.mirror("z")
+    slab.mirror("z")
+    assert slab.encode_slab(force_version=2) == original
+
+    with pytest.raises(SlabPositionOutOfRange):
+        slab.translate(x=-10000.0)
+    assert slab.encode_slab(force_version=2) == original
+
+
+def test_merge():
+    # Test that merging folds the layouts with the same UUID together.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    other = TSSlab()
+    other.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    other.translate(5.0, 0.0, 5.0)
+
+    merged = TSSlab()
+    merged.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    merged.merge(other)
+    assert [layout["uuid"] for layout in merged.data["layouts"]] == [layout.uuid for layout in slab.layouts]
+    for layout, slab_layout, other_layout in zip(merged.data["layouts"], slab.data["layouts"], other.data["layouts"]):
+        assert layout["instances"] == slab_layout["instances"] + other_layout["instances"]
+    assert merged.data["num_creatures"] == slab.data["num_creatures"] * 2
+
+    # Layouts of the slab that repeat a UUID are folded as well.
+    repeated = TSSlab()
+    repeated.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    repeated.layouts.append(TSSlabLayout(repeated.layouts[0].uuid))
+    repeated.layouts[-1].append(1.0, 2.0, 3.0, 45.0, (1.0, 1.0, 1.0))
+    repeated.merge()
+    assert [layout.uuid for layout in repeated.layouts] == [layout.uuid for layout in slab.layouts]
+    assert len(repeated.layouts[0]) == len(slab.layouts[0]) + 1
+
+
+def test_v1_transforms():
+    # Test that v1 slabs are only rotated by steps they can store and keep positions a float can store.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    with pytest.raises(ValueError):
+        slab.rotate(1)
+    slab.rotate(3)
+    assert all(degrees % 22.5 == 0 for layout in slab.layouts for degrees in layout.degrees)
+    with pytest.raises(SlabPositionOutOfRange):
+        slab.translate(x=1e39)
+
+
+def test_remove_duplicates():
+    # Test that stamping a slab onto itself is undone and near instances are reported.
+    slab = TSSlab()
+    slab.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    slab.decode_slab(slab.encode_slab(force_version=2))
+    original = slab.encode_slab()
+    count = sum(len(layout) for layout in slab.layouts)
+    assert slab.remove_duplicates() == 0
+
+    stamped = TSSlab()
+    stamped.decode_slab(original)
+    stamped.merge(slab, slab)
+    assert stamped.remove_duplicates() == count * 2
+    assert stamped.encode_slab() == original
+
+    nudged = TSSlab()
+    nudged.decode_slab(original)
+    nudged.translate(x=0.02)
+    stamped.merge(nudged)
+    near = stamped.find_near_duplicates(0.03)
+    layout = stamped.layouts[0]
+    assert (layout.uuid, 0, len(layout) // 2) in near
+    assert len(near) >= count
+    assert stamped.find_near_duplicates(0.01) == slab.find_near_duplicates(0.01)
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_incremental_encode(use_numpy):
+    # Test that an unchanged slab gives back its code and only the changed layouts are packed again.
+    if use_numpy:
+        pytest.importorskip("numpy")
+    slab_code = TEST_CASES[1].values[0]["slab_code"]
+    slab = TSSlab(use_numpy=use_numpy)
+    slab.decode_slab(slab_code)
+    assert slab.encode_slab() == slab_code
+    fast_code = slab.encode_slab(compression="fast")  # Other settings are encoded again.
+    assert fast_code != slab_code
+    fast_slab = TSSlab()
+    fast_slab.decode_slab(fast_code)
+    assert [layout.to_dict() for layout in fast_slab.layouts] == [layout.to_dict() for layout in slab.layouts]
+    slab.decode_slab(fast_code)
+    assert slab.encode_slab(compression="fast") == fast_code
+    assert slab.encode_slab() != fast_code
+
+    # Set an unused bit of the first instance, layouts that are not edited keep their decoded instances.
+    source = TSSlab()
+    source.decode_slab(slab_code)
+    v2_code = source.encode_slab(force_version=2)
+    source.decode_slab(v2_code)
+    data = bytearray(gzip.decompress(base64.b64decode(v2_code)))
+    offset = source._layout_offsets()[0]
+    data[offset + 7] |= 0x10
+    code = base64.b64encode(gzip.compress(bytes(data))).decode("ascii")
+    slab.decode_slab(code)
+    slab.layouts[1].pos_y[0] += 1.0
+    changed = gzip.decompress(base64.b64decode(slab.encode_slab()))
+    assert changed[offset:offset + 8] == data[offset:offset + 8]
+
+    full = TSSlab(use_numpy=use_numpy)
+    full.decode_slab(base64.b64encode(gzip.compress(changed)))
+    assert full.layouts[1].pos_y[0] == pytest.approx(slab.layouts[1].pos_y[0])
+    assert list(full.layouts[1].pos_y[1:]) == list(slab.layouts[1].pos_y[1:])
+
+    state = slab.__getstate__()
+    assert (state["_packed_cache"], state["_encoded"]) == ({}, None)
+    copied = pickle.loads(pickle.dumps(slab)).encode_slab()
+    assert gzip.decompress(base64.b64decode(copied))[offset + 8:] == changed[offset + 8:]
+
+
+def test_diff_and_patch():
+    # Test that a patch turns the old slab into the new one and only holds the changes.
+    source = TSSlab()
+    source.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    old_code = source.encode_slab(force_version=2)
+    new = TSSlab()
+    new.decode_slab(old_code)
+    new.layouts[0].pos_x[0] += 1.0
+    new.layouts[1].select(range(1, len(new.layouts[1])))
+    new.layouts.append(TSSlabLayout("00000000-0000-0000-0000-000000000001"))
+    new.layouts[-1].append(1.0, 2.0, 3.0, 45.0)
+    new_code = new.encode_slab()
+
+    patch = diff_slabs(old_code, new)
+    assert len(patch) == 4
+    assert set(patch.removed) == {new.layouts[0].uuid, new.layouts[1].uuid}
+    assert len(diff_slabs(new_code, new_code)) == 0
+
+    patch = TSSlabPatch.decode(patch.encode())
+    slab = TSSlab()
+    slab.decode_slab(old_code)
+    slab.apply_patch(patch)
+    patched = {layout.uuid: sorted(packed) for layout, packed in zip(slab.layouts, slab.packed_transforms())}
+    expected = {layout.uuid: sorted(packed) for layout, packed in zip(new.layouts, new.packed_transforms())}
+    assert patched == expected
+
+    with pytest.raises(SlabPatchConflict):
+        slab.apply_patch(patch)
+    assert {layout.uuid: sorted(packed) for layout, packed in zip(slab.layouts, slab.packed_transforms())} == expected
+    with pytest.raises(BadSlabCode):
+        TSSlabPatch.decode(old_code)
+
+
+def test_patch_repeated_layouts():
+    # Test that removals are matched in every layout that shares a UUID, as the diff counts all of them.
+    source = TSSlab()
+    source.decode_slab(TEST_CASES[1].values[0]["slab_code"])
+    source.decode_slab(source.encode_slab(force_version=2))
+    source.layouts.append(TSSlabLayout(source.layouts[0].uuid))
+    source.layouts[-1].append(1.0, 2.0, 3.0, 45.0)
+    source.layouts[-1].append(4.0, 5.0, 6.0, 90.0)
+    old_code = source.encode_slab()
+
+    new = TSSlab()
+    new.decode_slab(old_code)
+    new.layouts[-1].select([1])
+    patch = diff_slabs(old_code, new)
+    assert len(patch) == 1
+
+    slab = TSSlab()
+    slab.decode_slab(old_code)
+    slab.apply_patch(patch)
+    assert [len(layout) for layout in slab.layouts] == [len(layout) for layout in new.layouts]
+    assert slab.packed_transforms()[-1] == new.packed_transforms()[-1]
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from ts_encoding.slab import TSSlab
+
+
+def make_slab(count=2000, seed=1):
+    # Build a slab with random instances on the 0.01 position grid.
+    rng = random.Random(seed)
+    slab = TSSlab()
+    for n in range(5):
+        slab.data["layouts"].append({
+            "uuid": f"00000000-0000-4000-8000-00000000000{n}",
+            "instance_count": count,
+            "reserved": 0,
+            "instances": [
+                {"degrees": 0.0, "pos_x": rng.randrange(4000) / 100, "pos_y": rng.randrange(500) / 100,
+                 "pos_z": rng.randrange(4000) / 100}
+                for _ in range(count)
+            ],
+        })
+    slab.data["layout_count"] = 5
+    return slab
+
+
+def linear_scan(slab, keep):
+    return [
+        (layout["uuid"], n)
+        for layout in slab.data["layouts"]
+        for n, instance in enumerate(layout["instances"])
+        if keep(instance["pos_x"], instance["pos_y"], instance["pos_z"])
+    ]
+
+
+@pytest.mark.parametrize("cell_size", [0.5, 1.0, 4.0])
+def test_spatial_queries(cell_size):
+    # Test that the queries return the same instances as a linear scan.
+    slab = make_slab()
+    index = slab.spatial_index(cell_size)
+    assert len(index) == 10000
+
+    inf = float("inf")
+    boxes = [((3, 0, 5), (7.5, 2, 9)), ((-10, -10, -10), (100, 100, 100)), ((5, 5, 5), (4, 6, 6)),
+             ((-inf, -inf, -inf), (inf, inf, inf)), ((-inf, 1, 30), (10, inf, inf))]
+    for (min_x, min_y, min_z), (max_x, max_y, max_z) in boxes:
+        assert index.query_box((min_x, min_y, min_z), (max_x, max_y, max_z)) == linear_scan(
+            slab, lambda x, y, z: min_x <= x <= max_x and min_y <= y <= max_y and min_z <= z <= max_z
+        )
+
+    assert index.query_radius((20, 2, 20), 3.5) == linear_scan(
+        slab, lambda x, y, z: (x - 20) ** 2 + (y - 2) ** 2 + (z - 20) ** 2 <= 3.5 ** 2
+    )
+
+    assert TSSlab().spatial_index(cell_size).query_box((-inf, -inf, -inf), (inf, inf, inf)) == []
+
+    instance = slab.data["layouts"][3]["instances"][7]
+    point = (instance["pos_x"], instance["pos_y"], instance["pos_z"])
+    assert ("00000000-0000-4000-8000-000000000003", 7) in index.query_point(point)
+    assert index.query_point(point) == linear_scan(slab, lambda x, y, z: (x, y, z) == point)
@@ -4,14 +4,20 @@ from .exceptions import (
     SlabExceedsSizeLimit,
     BadSlabCode,
     UnsupportedSlabVersion,
+    SlabPositionOutOfRange,
+    SlabPatchConflict,
     InvalidTaleSpireDirectory,
-    InvalidAssetType
+    InvalidAssetType,
+    InvalidAssetIndex
 )
 
 __all__ = [
     "SlabExceedsSizeLimit",
     "BadSlabCode",
     "UnsupportedSlabVersion",
+    "SlabPositionOutOfRange",
+    "SlabPatchConflict",
     "InvalidTaleSpireDirectory",
-    "InvalidAssetType"
+    "InvalidAssetType",
+    "InvalidAssetIndex"
 ]
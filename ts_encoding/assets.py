@@ -5,16 +5,31 @@ It utilizes the `index.json` files within the installed location to get asset in
 """
 from __future__ import annotations
 
+import heapq
 import json
+import os
+import re
+import sys
 
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
+from typing import Iterable, Iterator
 
-from ts_encoding import InvalidTaleSpireDirectory, InvalidAssetType
+from ts_encoding import InvalidTaleSpireDirectory, InvalidAssetType, InvalidAssetIndex
+from ts_encoding.common import map_batch
+
+# Increased whenever the layout of the cached asset tables changes.
+_CACHE_VERSION = 2
+
+_WORD_PATTERN = re.compile(r"[^\W_]+")
 
 
 def get_asset_index_paths(ts_basedir: Path | str) -> list[Path]:
     """
     Given the base TaleSpire Directory get a list of all the paths to index.json files.
+    The paths are sorted so the content packs are always loaded in the same order.
 
     Args:
         ts_basedir: The base directory that TaleSpire is installed in.
@@ -23,7 +38,7 @@ def get_asset_index_paths(ts_basedir: Path | str) -> list[Path]:
     taleweaver_dir = ts_base_path / "Taleweaver"
 
     if taleweaver_dir.is_dir():
-        return list(taleweaver_dir.rglob("index.json"))
+        return sorted(taleweaver_dir.rglob("index.json"))
     else:
         raise InvalidTaleSpireDirectory(f"The supplied TaleSpire directory is not valid:\n\t{ts_base_path}")
 
@@ -42,75 +57,316 @@ def read_index_file(index_file: Path | str) -> dict:
     return index_dict
 
 
-def get_index_dicts(ts_basedir: Path | str) -> dict:
+def default_cache_path() -> Path:
+    """Returns the default location of the asset cache file, in the user cache directory."""
+    if sys.platform.startswith("win") and "LOCALAPPDATA" in os.environ:
+        cache_dir = Path(os.environ["LOCALAPPDATA"])
+    else:
+        cache_dir = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_dir / "ts_encoding" / "asset_cache.json"
+
+
+def read_asset_pack(index_file: Path | str) -> dict:
+    """
+    Read in the given index file and return a compact table of its assets.
+    Only what the asset library uses is kept so the table can be cached.
+
+    Args:
+        index_file: The TaleSpire index.json file to be read.
+
+    Returns:
+        dict: The pack "name", "path", "icon_atlases" and the "assets" table of each asset type.
+            Each table is stored by column, "id", "name", "deprecated", "atlas_index" and "region".
+            The atlas index is None when the asset has no icon, the region column holds 4 values per asset.
+    """
+    index_dict = read_index_file(index_file)
+    pack = {
+        "name": index_dict["Name"],
+        "path": str(index_file),
+        "icon_atlases": [atlas_entry["Path"] for atlas_entry in index_dict["IconsAtlases"]],
+        "assets": {},
+    }
+    for asset_type in TSAssetLib.default_asset_filter:
+        table = {"id": [], "name": [], "deprecated": [], "atlas_index": [], "region": []}
+        for asset_dict in index_dict.get(asset_type, []):
+            table["id"].append(asset_dict["Id"].lower())
+            table["name"].append(asset_dict["Name"])
+            table["deprecated"].append(asset_dict["IsDeprecated"] == 1)
+            icon = asset_dict.get("Icon")
+            if icon:
+                region = icon["Region"]
+                table["atlas_index"].append(icon["AtlasIndex"])
+                table["region"].extend((region["x"], region["y"], region["width"], region["height"]))
+            else:
+                table["atlas_index"].append(None)
+                table["region"].extend((0.0, 0.0, 0.0, 0.0))
+        pack["assets"][asset_type] = table
+    return pack
+
+
+def load_asset_packs(ts_basedir: Path | str, use_cache: bool = False, cache_path: Path | str | None = None,
+                     workers: int | None = None, use_processes: bool = False) -> list[dict]:
+    """
+    Given the base TaleSpire directory return the compact asset table of every content pack.
+
+    With `use_cache` the tables are kept in a cache file keyed by the path, modification time and size of each
+    index file, only the index files that changed since the cache was written are read again.
+    The index files are read concurrently, see `get_index_dicts`.
+
+    Args:
+        ts_basedir: The base directory that TaleSpire is installed in.
+        use_cache: Set to True to keep the tables in a cache file, by default every index file is read.
+        cache_path: The cache file to use, defaults to `default_cache_path()`.
+        workers: The number of index files read at the same time, 1 reads them one after another.
+        use_processes: Read the index files with a process pool instead of a thread pool.
+
+    Returns:
+        list: The asset tables as returned by `read_asset_pack` in the order of the index files.
+    """
+    index_files = get_asset_index_paths(ts_basedir)
+    if not use_cache:
+        return _read_index_files(_read_asset_pack_item, index_files, workers, use_processes)
+
+    cache_path = Path(str(cache_path)) if cache_path else default_cache_path()
+    cache = _read_cache(cache_path)
+    taleweaver_dir = str(Path(str(ts_basedir)) / "Taleweaver")
+
+    entries = {}
+    changed_files = []
+    for index_file in index_files:
+        stat = index_file.stat()
+        key = str(index_file.resolve())
+        entry = cache.get(key)
+        if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "pack": None}
+            changed_files.append(index_file)
+        entries[key] = entry
+
+    changed_packs = iter(_read_index_files(_read_asset_pack_item, changed_files, workers, use_processes))
+    packs = []
+    for index_file, entry in zip(index_files, entries.values()):
+        if entry["pack"] is None:
+            entry["pack"] = next(changed_packs)
+        entry["pack"]["path"] = str(index_file)
+        packs.append(entry["pack"])
+    changed = bool(changed_files)
+
+    # Entries for index files of this install that no longer exist are dropped, other installs are kept.
+    taleweaver_key = str(Path(taleweaver_dir).resolve())
+    for key, entry in cache.items():
+        if key not in entries:
+            if key.startswith(taleweaver_key + os.sep):
+                changed = True
+            else:
+                entries[key] = entry
+
+    if changed:
+        _write_cache(cache_path, entries)
+    return packs
+
+
+def _read_cache(cache_path: Path) -> dict:
+    """Read the asset cache file, a missing, unreadable or outdated cache is treated as empty."""
+    try:
+        with cache_path.open("r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != _CACHE_VERSION:
+        return {}
+    return cache["entries"]
+
+
+def _write_cache(cache_path: Path, entries: dict) -> None:
+    """Write the asset cache file, it is replaced in one step so other processes never read a partial file."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with temp_path.open("w", encoding="utf-8") as f:
+            json.dump({"version": _CACHE_VERSION, "entries": entries}, f, separators=(",", ":"))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # The cache is only an optimization, the library still works without it.
+
+
+def get_index_dicts(ts_basedir: Path | str, workers: int | None = None, use_processes: bool = False) -> dict:
     """
     Given the base TaleSpire directory return a dictionary containing
     all the content pack asset indexes as dictionaries.
 
+    The index files are read concurrently with a thread pool, a process pool can be used instead as parsing
+    large index files is CPU bound. The order of the indexes is always the order of `get_asset_index_paths`.
+
     Args:
         ts_basedir: The base directory that TaleSpire is installed in.
+        workers: The number of index files read at the same time, 1 reads them one after another.
+        use_processes: Read the index files with a process pool instead of a thread pool.
+
+    Raises:
+        InvalidAssetIndex: If an index file fails to read, the first failing file in order is reported.
     """
     index_files = get_asset_index_paths(ts_basedir)
 
     index_dicts = {}
 
-    for index_file in index_files:
-        index_dict = read_index_file(index_file)
+    for index_file, index_dict in zip(
+            index_files, _read_index_files(_read_index_item, index_files, workers, use_processes)):
         index_name = index_dict["Name"]
         index_dicts[index_name] = {"path": str(index_file), "index": index_dict}
 
     return index_dicts
 
 
+def _read_index_files(read_func, index_files: list[Path], workers: int | None, use_processes: bool) -> list:
+    """
+    Read the index files concurrently, the results are in the same order as the index files.
+
+    Raises:
+        InvalidAssetIndex: If an index file fails to read, the first failing file in order is reported.
+    """
+    results = map_batch(read_func, index_files, workers, use_threads=not use_processes)
+    for result in results:
+        if isinstance(result, InvalidAssetIndex):
+            raise result
+    return results
+
+
+def _read_index_item(index_file: Path) -> dict | InvalidAssetIndex:
+    """Read a single index file for `get_index_dicts`, errors are returned with the path of the file."""
+    try:
+        index_dict = read_index_file(index_file)
+        if "Name" not in index_dict:
+            raise ValueError("The index has no content pack name.")
+        return index_dict
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return _index_error(index_file, e)
+
+
+def _read_asset_pack_item(index_file: Path) -> dict | InvalidAssetIndex:
+    """Read a single asset table for `load_asset_packs`, errors are returned with the path of the file."""
+    try:
+        return read_asset_pack(index_file)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return _index_error(index_file, e)
+
+
+def _index_error(index_file: Path, error: Exception) -> InvalidAssetIndex:
+    """Create the exception for an index file that failed to read."""
+    exception = InvalidAssetIndex(f"Failed to read the asset index:\n\t{index_file}\n\t{error!r}", str(index_file))
+    exception.__cause__ = error
+    return exception
+
+
 class TSAssetLib:
 
     # This is the default list of asset loaded as well as the valid types excepted.
     default_asset_filter = ["Tiles", "Props", "Creatures", "Music"]
 
-    def __init__(self, ts_basedir, asset_filter: list[str] | None = None):
+    def __init__(self, ts_basedir, asset_filter: list[str] | None = None, use_cache: bool = False,
+                 cache_path: Path | str | None = None, workers: int | None = None, use_processes: bool = False,
+                 lazy: bool = False):
         """
         TaleSpire Asset Library
-        This reads in all the TaleSpire assets and stores them both in index form and by UUID.
+        This reads in all the TaleSpire assets and stores them by UUID.
 
         A filter can be set to limit what types of assets are stored.
         Valid types are: ["Tiles", "Props", "Creatures", "Music"]
         The default is all asset types.
 
+        The assets can be kept in a cache file so later libraries only read the index files that changed,
+        see `load_asset_packs`.
+
+        In lazy mode only the location of each UUID is indexed up front, the asset objects are created the
+        first time `asset` returns them. This suits jobs that only look up a few assets.
+
         Args:
             ts_basedir: The base directory that TaleSpire is installed in.
             asset_filter: A list of asset types to use as a filter.
+            use_cache: Set to True to use the cache file, by default every index file is read.
+            cache_path: The cache file to use, defaults to `default_cache_path()`.
+            workers: The number of index files read at the same time, 1 reads them one after another.
+            use_processes: Read the index files with a process pool instead of a thread pool.
+            lazy: Set to True to create the assets when they are first used.
         """
-        self.index_dicts = get_index_dicts(ts_basedir)
+        self.ts_basedir = ts_basedir
+        self.workers = workers
+        self.use_processes = use_processes
         self.asset_filter = asset_filter if asset_filter else self.default_asset_filter
-        self.index_names = list(self.index_dicts.keys())
-        self.asset_uuid_dict: dict[str, TSAsset] = {}
-        self._build_asset_uuid_dict()
-
-    def _build_asset_uuid_dict(self) -> None:
-        for index_name in self.index_names:
-            index_path = Path(self.index_dicts[index_name]["path"])
-            index_dict = self.index_dicts[index_name]["index"]
-
-            icon_atlases = []
-            for atlas_entry in index_dict["IconsAtlases"]:
-                icon_atlases.append(atlas_entry["Path"])
-
+        self.packs = load_asset_packs(ts_basedir, use_cache, cache_path, workers, use_processes)
+        self.index_names = list(dict.fromkeys(pack["name"] for pack in self.packs))
+        self._index_dicts = None
+        self._search_index = None
+        self._icon_atlases = {}  # The icon atlas paths of each pack by pack index, built when first needed.
+        # The index entries of the packs used last, shared by the assets so an index file is not read for every entry.
+        self._index_entries = _IndexEntries()
+        self._asset_locations: dict[str, tuple[int, str, int]] = {}  # (pack index, asset type, row index)
+        self._build_asset_locations()
+        self._asset_uuid_dict: dict[str, TSAsset] = {}
+        self._complete = False
+        if not lazy:
+            self._build_asset_uuid_dict()
+
+    @property
+    def index_dicts(self) -> dict:
+        """The full content pack indexes as returned by `get_index_dicts`, these are read when first used."""
+        if self._index_dicts is None:
+            self._index_dicts = get_index_dicts(self.ts_basedir, self.workers, self.use_processes)
+        return self._index_dicts
+
+    @property
+    def asset_uuid_dict(self) -> dict[str, TSAsset]:
+        """All the assets by UUID, in lazy mode this creates every asset that has not been used yet."""
+        if not self._complete:
+            self._build_asset_uuid_dict()
+        return self._asset_uuid_dict
+
+    def _build_asset_locations(self) -> None:
+        """Index the pack, type and row of every asset by UUID."""
+        for asset_type in self.asset_filter:
+            if asset_type.title() not in self.default_asset_filter:
+                raise InvalidAssetType(
+                    f"Invalid Asset Filter: {asset_type.title()}\nValid types are: {self.default_asset_filter}"
+                )
+
+        for pack_index, pack in enumerate(self.packs):
             for asset_type in self.asset_filter:
                 asset_type = asset_type.title()
-                if asset_type not in self.default_asset_filter:
-                    raise InvalidAssetType(
-                        f"Invalid Asset Filter: {asset_type}\nValid types are: {self.default_asset_filter}"
-                    )
+                for row_index, asset_uuid in enumerate(pack["assets"][asset_type]["id"]):
+                    self._asset_locations[asset_uuid] = (pack_index, asset_type, row_index)
 
-                for asset_dict in self.index_dicts[index_name]["index"][asset_type]:
-                    if "Icon" in asset_dict:
-                        asset = TSIconAsset(asset_dict, asset_type)
-                        atlas_index = asset_dict["Icon"]["AtlasIndex"]
-                        asset.icon_atlas = str(index_path.parent / icon_atlases[atlas_index])
-                    else:
-                        asset = TSAsset(asset_dict, asset_type)
-
-                    self.asset_uuid_dict[asset.id] = asset
+    def _build_asset_uuid_dict(self) -> None:
+        """Create every asset, assets that were already created are kept."""
+        self._asset_uuid_dict = {
+            asset_uuid: self._asset_uuid_dict.get(asset_uuid) or self._create_asset(location)
+            for asset_uuid, location in self._asset_locations.items()
+        }
+        self._complete = True
+
+    def _icon_atlas_paths(self, pack_index: int) -> list[str]:
+        """The full icon atlas paths of a pack, these are built once per pack."""
+        icon_atlases = self._icon_atlases.get(pack_index)
+        if icon_atlases is None:
+            pack = self.packs[pack_index]
+            index_path = Path(pack["path"])
+            icon_atlases = [str(index_path.parent / atlas_path) for atlas_path in pack["icon_atlases"]]
+            self._icon_atlases[pack_index] = icon_atlases
+        return icon_atlases
+
+    def _create_asset(self, location: tuple[int, str, int]) -> TSAsset:
+        """Create the asset stored at the (pack index, asset type, row index) location."""
+        pack_index, asset_type, row_index = location
+        pack = self.packs[pack_index]
+        table = pack["assets"][asset_type]
+        asset_uuid, name, deprecated = table["id"][row_index], table["name"][row_index], table["deprecated"][row_index]
+        atlas_index = table["atlas_index"][row_index]
+        if atlas_index is None:
+            return TSAsset.from_record(asset_uuid, name, asset_type, deprecated, pack["path"],
+                                       self._index_entries)
+
+        region = tuple(table["region"][row_index * 4:row_index * 4 + 4])
+        return TSIconAsset.from_record(asset_uuid, name, asset_type, deprecated, pack["path"],
+                                       self._index_entries, atlas_index,
+                                       self._icon_atlas_paths(pack_index)[atlas_index], region)
 
     def asset(self, asset_uuid: str) -> TSAsset:
         """
@@ -119,27 +375,266 @@ class TSAssetLib:
         Args:
             asset_uuid: The TaleSpire asset UUID
         """
-        asset = self.asset_uuid_dict.get(asset_uuid, None)
+        asset = self._asset_uuid_dict.get(asset_uuid, None)
+        if asset is None and not self._complete:
+            location = self._asset_locations.get(asset_uuid)
+            if location is not None:
+                asset = self._create_asset(location)
+                self._asset_uuid_dict[asset_uuid] = asset
         return asset
 
     def assets(self) -> list[TSAsset]:
         """Returns a list of all the assets in the library."""
         return list(self.asset_uuid_dict.values())
 
+    def search(self, query: str, asset_types: list[str] | None = None, include_deprecated: bool = False,
+               limit: int | None = 20) -> list[TSAsset]:
+        """
+        Search the assets by name, see `TSAssetSearchIndex.search`.
+        The search index is built the first time this is called.
+
+        Args:
+            query: The words to search for, each word can be the start or any part of a word in the name.
+            asset_types: Only return assets of these types, the default is every type in the library.
+            include_deprecated: Set to True to also return deprecated assets.
+            limit: The maximum number of assets returned, None returns every match.
+
+        Returns:
+            list: The matching assets, best matches first.
+        """
+        if self._search_index is None:
+            self._search_index = TSAssetSearchIndex(self)
+        asset_uuids = self._search_index.search(query, asset_types, include_deprecated, limit)
+        return [self.asset(asset_uuid) for asset_uuid in asset_uuids]
+
+
+class TSAssetSearchIndex:
+    """
+    A name search index over the assets of a library, built for autocomplete.
+
+    Every word of every name is kept in a sorted list to find the words that start with a query word,
+    and each word is indexed by its trigrams to find the words that contain a query word.
+    Matches are ranked: an exact name, then names starting with the query, then names where each query word
+    starts a word, then names that only contain the query words. Shorter names rank first after that.
+    """
+
+    def __init__(self, library: TSAssetLib):
+        """
+        Args:
+            library: The asset library to index, only its compact pack tables are used.
+        """
+        assets = []
+        for asset_uuid, (pack_index, asset_type, row_index) in library._asset_locations.items():
+            table = library.packs[pack_index]["assets"][asset_type]
+            name = table["name"][row_index].lower()
+            assets.append((len(name), name, asset_uuid, asset_type, table["deprecated"][row_index]))
+
+        # The entries are numbered in rank order for equally good matches, so ranking is sorting by entry.
+        assets.sort()
+        self.ids = [asset[2] for asset in assets]
+        self.names = [asset[1] for asset in assets]
+        self.types = [asset[3] for asset in assets]
+        self.deprecated = [asset[4] for asset in assets]
+        self._name_order = sorted(range(len(self.names)), key=self.names.__getitem__)
+        self._sorted_names = [self.names[entry] for entry in self._name_order]
+
+        word_entries = {}
+        for entry, name in enumerate(self.names):
+            for word in _WORD_PATTERN.findall(name):
+                entries = word_entries.setdefault(word, [])
+                if not entries or entries[-1] != entry:
+                    entries.append(entry)
+        self._word_entries = word_entries
+        self._words = sorted(word_entries)
+
+        trigram_words = {}
+        for word in self._words:
+            for trigram in _trigrams(word):
+                trigram_words.setdefault(trigram, set()).add(word)
+        self._trigram_words = trigram_words
+
+    def search(self, query: str, asset_types: list[str] | None = None, include_deprecated: bool = False,
+               limit: int | None = 20) -> list[str]:
+        """
+        Search the asset names.
+
+        Args:
+            query: The words to search for, each word can be the start or any part of a word in the name.
+            asset_types: Only return assets of these types.
+            include_deprecated: Set to True to also return deprecated assets.
+            limit: The maximum number of results, None returns every match.
+
+        Returns:
+            list: The UUIDs of the matching assets, best matches first.
+        """
+        query = query.lower().strip()
+        query_words = _WORD_PATTERN.findall(query)
+        if not query_words:
+            return []
+
+        asset_types = {asset_type.title() for asset_type in asset_types} if asset_types else None
+        types, deprecated = self.types, self.deprecated
+
+        def allowed(entry: int) -> bool:
+            if not include_deprecated and deprecated[entry]:
+                return False
+            return asset_types is None or types[entry] in asset_types
+
+        # Names starting with the query rank first, an exact name is the shortest of them so it comes first.
+        start = bisect_left(self._sorted_names, query)
+        end = bisect_left(self._sorted_names, query + "\U0010ffff", start)
+        name_matches = filter(allowed, self._name_order[start:end])
+        results = heapq.nsmallest(limit, name_matches) if limit is not None else sorted(name_matches)
+        if limit is not None and len(results) >= limit:
+            return [self.ids[entry] for entry in results]
+
+        found = set(results)
+        word_matches = (entry for entry in self._word_matches(query_words) if entry not in found and allowed(entry))
+        results.extend(islice(word_matches, None if limit is None else limit - len(results)))
+        return [self.ids[entry] for entry in results]
+
+    def _word_matches(self, query_words: list[str]) -> Iterator[int]:
+        """
+        The entries where every query word starts or is part of a word in the name, in rank order.
+        The entries are ranked by the number of query words that only matched inside a word, then by entry.
+        """
+        if len(query_words) == 1:
+            # A single word is streamed from the sorted entry lists so only the returned entries are visited.
+            query_word = query_words[0]
+            prefix_lists = [self._word_entries[word] for word in self._prefix_words(query_word)]
+            substring_lists = [self._word_entries[word] for word in self._substring_words(query_word)]
+            prefix_entries = _unique(heapq.merge(*prefix_lists))
+            substring_entries = _unique(heapq.merge(*substring_lists))
+            yield from prefix_entries
+            for entry in substring_entries:
+                if not any(word.startswith(query_word) for word in _WORD_PATTERN.findall(self.names[entry])):
+                    yield entry
+            return
+
+        substring_counts = None
+        for query_word in query_words:
+            prefix_entries = self._entries(self._prefix_words(query_word))
+            substring_entries = self._entries(self._substring_words(query_word)) - prefix_entries
+            if substring_counts is None:
+                substring_counts = dict.fromkeys(prefix_entries, 0)
+                substring_counts.update(dict.fromkeys(substring_entries, 1))
+            else:
+                substring_counts = {
+                    entry: count + (entry in substring_entries)
+                    for entry, count in substring_counts.items()
+                    if entry in prefix_entries or entry in substring_entries
+                }
+            if not substring_counts:
+                return
+        for count, entry in sorted((count, entry) for entry, count in substring_counts.items()):
+            yield entry
+
+    def _prefix_words(self, query_word: str) -> list[str]:
+        """The indexed words that start with the query word."""
+        words = self._words
+        start = bisect_left(words, query_word)
+        end = bisect_left(words, query_word + "\U0010ffff", start)
+        return words[start:end]
+
+    def _substring_words(self, query_word: str) -> list[str]:
+        """The indexed words that contain the query word, found by intersecting the word sets of its trigrams."""
+        if len(query_word) < 3:
+            return []
+        word_sets = sorted((self._trigram_words.get(trigram, set()) for trigram in _trigrams(query_word)), key=len)
+        candidates = word_sets[0].intersection(*word_sets[1:])
+        return [word for word in candidates if query_word in word]
+
+    def _entries(self, words: list[str]) -> set[int]:
+        """The entries that have any of the words in their name."""
+        entries = set()
+        for word in words:
+            entries.update(self._word_entries[word])
+        return entries
+
+
+def _unique(entries: Iterable[int]) -> Iterator[int]:
+    """Skip repeated entries in a sorted stream of entries."""
+    previous = None
+    for entry in entries:
+        if entry != previous:
+            yield entry
+            previous = entry
+
+
+def _trigrams(word: str) -> set[str]:
+    """The set of 3 character sequences in a word."""
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
 
 class TSAsset:
+    """
+    A compact TaleSpire asset record.
+    The library only stores the fields it uses, the full entry from the index file is read by `asset_dict`.
+    """
+
+    __slots__ = ("asset_type", "index_path", "id", "name", "deprecated", "_asset_dict", "_entries")
 
-    def __init__(self, asset_dict, asset_type):
-        self.asset_dict = asset_dict
+    def __init__(self, asset_dict: dict, asset_type: str):
+        """
+        Args:
+            asset_dict: The asset entry from the index file.
+            asset_type: The asset type, one of `TSAssetLib.default_asset_filter`.
+        """
         self.asset_type = asset_type
+        self.index_path = None
         self.id = asset_dict["Id"].lower()
         self.name = asset_dict["Name"]
         self.deprecated = asset_dict["IsDeprecated"] == 1
+        self._asset_dict = asset_dict
+        self._entries = None
+
+    @classmethod
+    def from_record(cls, asset_uuid: str, name: str, asset_type: str, deprecated: bool, index_path: str,
+                    entries: _IndexEntries | None = None) -> TSAsset:
+        """
+        Create an asset from the fields of a pack table without its index entry, see `read_asset_pack`.
+
+        Args:
+            asset_uuid: The asset UUID in lower case.
+            name: The asset name.
+            asset_type: The asset type, one of `TSAssetLib.default_asset_filter`.
+            deprecated: True if the asset is deprecated.
+            index_path: The path to the index.json file the asset is defined in.
+            entries: The index entries shared by the assets of a library, defaults to the entries shared by
+                the assets created without a library.
+        """
+        asset = cls.__new__(cls)
+        asset.asset_type = asset_type
+        asset.index_path = index_path
+        asset.id = asset_uuid
+        asset.name = name
+        asset.deprecated = deprecated
+        asset._asset_dict = None
+        asset._entries = entries if entries is not None else _INDEX_ENTRIES
+        return asset
+
+    @property
+    def asset_dict(self) -> dict | None:
+        """
+        The asset entry from the index file.
+        Assets created from a pack table read it from the index file, the entries of the few index files used
+        last are kept so the file is not read again for every asset of the pack.
+        """
+        if self._asset_dict is None:
+            return self._entries.get(self.index_path, self.asset_type, self.id)
+        return self._asset_dict
 
 
 class TSIconAsset(TSAsset):
 
-    def __init__(self, asset_dict, asset_type):
+    __slots__ = ("icon_atlas_index", "icon_atlas", "atlas_region")
+
+    def __init__(self, asset_dict: dict, asset_type: str):
+        """
+        Args:
+            asset_dict: The asset entry from the index file, it must have an "Icon" entry.
+            asset_type: The asset type, one of `TSAssetLib.default_asset_filter`.
+        """
         super().__init__(asset_dict, asset_type)
         self.icon_atlas_index = asset_dict["Icon"]["AtlasIndex"]
         self.icon_atlas = ""
@@ -149,4 +644,54 @@ class TSIconAsset(TSAsset):
             atlas_region["y"],
             atlas_region["width"],
             atlas_region["height"]
-        )
\ No newline at end of file
+        )
+
+    @classmethod
+    def from_record(cls, asset_uuid: str, name: str, asset_type: str, deprecated: bool, index_path: str,
+                    entries: _IndexEntries | None = None, icon_atlas_index: int = 0, icon_atlas: str = "",
+                    atlas_region: tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0)) -> TSIconAsset:
+        """
+        Create an icon asset from the fields of a pack table, see `TSAsset.from_record`.
+
+        Args:
+            icon_atlas_index: The index of the icon atlas in the content pack.
+            icon_atlas: The path to the icon atlas image.
+            atlas_region: The (x, y, width, height) region of the icon in the atlas.
+        """
+        asset = super().from_record(asset_uuid, name, asset_type, deprecated, index_path, entries)
+        asset.icon_atlas_index = icon_atlas_index
+        asset.icon_atlas = icon_atlas
+        asset.atlas_region = atlas_region
+        return asset
+
+
+class _IndexEntries:
+    """
+    The asset entries of index files by (asset type, UUID), the entries of the index files used last are kept.
+    An index file is read again once `maxsize` other index files were used since.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        """
+        Args:
+            maxsize: The number of index files whose entries are kept.
+        """
+        self._read_entries = lru_cache(maxsize)(_read_index_entries)
+
+    def get(self, index_path: str, asset_type: str, asset_uuid: str) -> dict | None:
+        """Return the entry of an asset, or None if the index file does not have it."""
+        return self._read_entries(index_path).get((asset_type, asset_uuid))
+
+
+def _read_index_entries(index_path: str) -> dict[tuple[str, str], dict]:
+    """Read the asset entries of an index file by (asset type, UUID)."""
+    index_dict = read_index_file(index_path)
+    return {
+        (entry_type, asset_dict["Id"].lower()): asset_dict
+        for entry_type in TSAssetLib.default_asset_filter
+        for asset_dict in index_dict.get(entry_type, [])
+    }
+
+
+# The index entries shared by the assets created without a library.
+_INDEX_ENTRIES = _IndexEntries()
@@ -6,10 +6,183 @@ https://talespire.com/url-scheme
 
 Standard Byte order is little-endian
 """
+from __future__ import annotations
+
 import base64
+import math
+import os
+import re
 import struct
+import sys
 import uuid
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Iterable
+
+# Precompiled structs for the primitive types.
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+_I32 = struct.Struct("<i")
+
+
+class TSUUIDCache:
+    """
+    A bounded LRU cache of UUID conversions shared by all the encoders.
+    The same asset UUIDs repeat across many slabs and blueprints, so each raw 16 bytes is converted to a string
+    once and the interned string is reused, the strings are converted back to bytes the same way when encoding.
+
+    Slab UUIDs use a mixed-endian layout, the first three fields are little-endian which is what `bytes_le` uses.
+    """
+
+    def __init__(self, maxsize: int = 8192):
+        """
+        Args:
+            maxsize: The maximum number of conversions kept in each direction for each UUID layout.
+        """
+        self.maxsize = maxsize
+        self.uuid_str = lru_cache(maxsize)(lambda raw: sys.intern(str(uuid.UUID(bytes=raw))))
+        self.slab_uuid_str = lru_cache(maxsize)(lambda raw: sys.intern(str(uuid.UUID(bytes_le=raw))))
+        self.uuid_bytes = lru_cache(maxsize)(lambda uuid_str: uuid.UUID(uuid_str).bytes)
+        self.slab_uuid_bytes = lru_cache(maxsize)(lambda uuid_str: uuid.UUID(uuid_str).bytes_le)
+        self._caches = (self.uuid_str, self.slab_uuid_str, self.uuid_bytes, self.slab_uuid_bytes)
+
+    @property
+    def hits(self) -> int:
+        """The number of conversions that were found in the cache."""
+        return sum(cache.cache_info().hits for cache in self._caches)
+
+    @property
+    def misses(self) -> int:
+        """The number of conversions that had to be computed."""
+        return sum(cache.cache_info().misses for cache in self._caches)
+
+    def __len__(self) -> int:
+        return sum(cache.cache_info().currsize for cache in self._caches)
+
+    def clear(self) -> None:
+        """Empty the cache and reset the hit and miss counters."""
+        for cache in self._caches:
+            cache.cache_clear()
+
+
+# The UUID cache used by all the encoders.
+UUID_CACHE = TSUUIDCache()
+
+# Special record field types, these are read as 16 bytes and converted to and from a UUID string.
+_UUID_TYPES = {
+    "uuid": (lambda raw: UUID_CACHE.uuid_str(raw), lambda uuid_str: UUID_CACHE.uuid_bytes(uuid_str)),
+    "slab_uuid": (lambda raw: UUID_CACHE.slab_uuid_str(raw), lambda uuid_str: UUID_CACHE.slab_uuid_bytes(uuid_str)),
+}
+
+_FIELD_FORMAT = re.compile(r"^(\d*)([xcbB?hHiIlLqQefds])$")
+
+
+class TSRecord:
+    """
+    A fixed-width binary record, described once by its fields and compiled into a single `struct.Struct`.
+    Reading or writing a record is a single struct call no matter how many fields it has.
+
+    Each field is a (name, format) tuple, the format is a little-endian `struct` format code with an optional count.
+        ("layout_count", "H")   A single value.
+        ("reserved0", "8H")     Fields with a count are unpacked as a tuple.
+        ("morph_id", "uuid")    A UUID string, "slab_uuid" is the mixed-endian layout used by slabs.
+        (None, "3x")            Padding bytes, these have no name.
+    """
+
+    def __init__(self, *fields: tuple[str | None, str]):
+        """
+        Args:
+            *fields: The (name, format) tuples in the order they are stored.
+        """
+        self.names = []
+        self._fields = []  # (name, start index, count or None for a single value, converter)
+        self._pack_converters = []
+        formats = []
+        index = 0
+        for name, field_format in fields:
+            if field_format in _UUID_TYPES:
+                unpack_converter, pack_converter = _UUID_TYPES[field_format]
+                formats.append("16s")
+                self._fields.append((name, index, None, unpack_converter))
+                self._pack_converters.append((name, None, pack_converter))
+                self.names.append(name)
+                index += 1
+                continue
+
+            match = _FIELD_FORMAT.match(field_format)
+            if not match:
+                raise ValueError(f"Invalid record field format: {field_format}")
+            formats.append(field_format)
+            count, code = match.groups()
+            if code == "x":
+                continue
+
+            count = int(count) if count and code != "s" else None
+            self._fields.append((name, index, count, None))
+            self._pack_converters.append((name, count, None))
+            self.names.append(name)
+            index += count or 1
+
+        self.struct = struct.Struct("<" + "".join(formats))
+        self.size = self.struct.size
+
+    def unpack_from(self, buffer, offset: int = 0) -> dict:
+        """
+        Unpack the record from a buffer.
+
+        Args:
+            buffer: Any buffer-protocol object.
+            offset: The offset of the record in the buffer.
+
+        Returns:
+            dict: The field values by name.
+        """
+        values = self.struct.unpack_from(buffer, offset)
+        record = {}
+        for name, index, count, converter in self._fields:
+            if count:
+                record[name] = values[index:index + count]
+            elif converter:
+                record[name] = converter(values[index])
+            else:
+                record[name] = values[index]
+        return record
+
+    def pack(self, record: dict) -> bytes:
+        """
+        Pack the record to bytes.
+
+        Args:
+            record: The field values by name, fields with a count take a sequence of values.
+        """
+        return self.struct.pack(*self._pack_values(record))
+
+    def pack_into(self, buffer, offset: int, record: dict) -> None:
+        """
+        Pack the record into a writable buffer.
+
+        Args:
+            buffer: A writable buffer-protocol object.
+            offset: The offset to write the record at.
+            record: The field values by name, fields with a count take a sequence of values.
+        """
+        self.struct.pack_into(buffer, offset, *self._pack_values(record))
+
+    def _pack_values(self, record: dict) -> list:
+        """Flatten the record values into the order of the compiled struct."""
+        values = []
+        for name, count, converter in self._pack_converters:
+            if count:
+                values.extend(record[name])
+            elif converter:
+                values.append(converter(record[name]))
+            else:
+                values.append(record[name])
+        return values
+
 
 class TSCodingBase:
     """
@@ -44,10 +217,27 @@ class TSCodingBase:
         Preps self._code into self._binary_data then runs self._decode_steps()
         It is up to the subclass to set self._code
         """
-        self._binary_data = base64.b64decode(self._code)  # Decode the encoded string into binary data
-        self._offset = 0  # Reset the offset index of the binary data
+        self._load_code()
         self._decode_steps()
 
+    def _load_code(self) -> None:
+        """
+        Decodes self._code into self._binary_data and resets the offset.
+        The code can be a string or any buffer-protocol object (bytes, bytearray, memoryview, mmap).
+        The binary data is kept as a memoryview so slicing it while decoding does not copy.
+        """
+        self._binary_data = memoryview(base64.b64decode(self._code))  # Decode the encoded string into binary data
+        self._offset = 0  # Reset the offset index of the binary data
+
+    def __getstate__(self) -> dict:
+        """Memoryviews and other buffers can not always be pickled, they are copied to bytes when pickling."""
+        state = self.__dict__.copy()
+        for key in ("_code", "_binary_data"):
+            value = state[key]
+            if value is not None and not isinstance(value, (str, bytes, bytearray)):
+                state[key] = memoryview(value).tobytes()
+        return state
+
     def _decode_steps(self) -> None:
         """
         This is meant to be overridden by the subclass.
@@ -58,13 +248,39 @@ class TSCodingBase:
 
     def _encode(self) -> None:
         """
-        Resets self._binary_data, runs self._encode_steps and encodes the new binary data to self._code
+        Allocates self._binary_data, runs self._encode_steps and encodes the new binary data to self._code
         It is up to the subclass to reveal self._code to the user or application.
         """
-        self._binary_data = bytearray()
+        self._binary_data = bytearray(self._binary_size())  # Allocated once, the pack methods write into it.
+        self._offset = 0
         self._encode_steps()
         self._code = base64.b64encode(self._binary_data)
 
+    def _binary_size(self) -> int:
+        """
+        This is meant to be overridden by the subclass.
+        Returns the exact size in bytes of the binary data `self._encode_steps` will write, so the buffer
+        can be allocated once. If the size is too small the buffer grows as needed.
+        """
+        return 0
+
+    def _reserve(self, num_bytes: int) -> int:
+        """
+        Reserves space to write at the current offset and advances the offset past it.
+        The buffer only grows if the precomputed size was too small.
+
+        Args:
+            num_bytes: The number of bytes that will be written.
+
+        Returns:
+            int: The offset to write the data at.
+        """
+        offset = self._offset
+        self._offset += num_bytes
+        if self._offset > len(self._binary_data):
+            self._binary_data.extend(bytes(self._offset - len(self._binary_data)))
+        return offset
+
     def _encode_steps(self) -> None:
         """
         This is meant to be overridden by the subclass.
@@ -75,25 +291,25 @@ class TSCodingBase:
 
     def _unpack_u8(self) -> int:
         """Unpacks a u8 - Unsigned 8-bit integer (1 byte)"""
-        result, = struct.unpack_from("<B", self._binary_data, self._offset)
+        result, = _U8.unpack_from(self._binary_data, self._offset)
         self._offset += 1
         return result
 
     def _unpack_u16(self) -> int:
         """Unpacks a u16 - Unsigned Short Integer (2 bytes)"""
-        result, = struct.unpack_from("<H", self._binary_data, self._offset)
+        result, = _U16.unpack_from(self._binary_data, self._offset)
         self._offset += 2
         return result
 
     def _unpack_u32(self) -> int:
         """Unpacks a u32 - Unsigned 32-bit Integer (4 bytes)"""
-        result, = struct.unpack_from("<I", self._binary_data, self._offset)
+        result, = _U32.unpack_from(self._binary_data, self._offset)
         self._offset += 4
         return result
 
     def _unpack_u64(self) -> int:
         """Unpacks a u64 - Unsigned 64-bit integer (8 bytes)"""
-        result, = struct.unpack_from("<Q", self._binary_data, self._offset)
+        result, = _U64.unpack_from(self._binary_data, self._offset)
         self._offset += 8
         return result
 
@@ -107,37 +323,45 @@ class TSCodingBase:
         Returns:
             str: Decoded UTF-8 string
         """
-        result, = struct.unpack_from(f"<{num_bytes}s", self._binary_data, self._offset)
-        self._offset += num_bytes
+        end = self._offset + num_bytes
+        if end > len(self._binary_data):
+            raise struct.error(f"unpack_utf8 requires a buffer of at least {end} bytes")
+        # Decoded straight from a view of the binary data, only the resulting string is created.
+        result = str(memoryview(self._binary_data)[self._offset:end], "utf-8")
+        self._offset = end
         return result
 
     def _unpack_i32(self) -> int:
         """Unpacks an i32 - Signed 32-bit integer (4 bytes)"""
-        result, = struct.unpack_from("<i", self._binary_data, self._offset)
+        result, = _I32.unpack_from(self._binary_data, self._offset)
         self._offset += 4
         return result
 
     def _unpack_uuid(self) -> str:
         """Unpacks a UUID - 128-bit identifier (16 bytes)"""
-        result, = struct.unpack_from(f"16s", self._binary_data, self._offset)
+        result = UUID_CACHE.uuid_str(bytes(self._binary_data[self._offset:self._offset + 16]))
         self._offset += 16
-        return str(uuid.UUID(bytes=result))
+        return result
 
     def _unpack_slab_uuid(self) -> str:
         """Unpacks a slab UUID - 128-bit identifier (16 bytes, mixed-endian layout)"""
-        fields = struct.unpack_from("<IHH8B", self._binary_data, self._offset)
+        result = UUID_CACHE.slab_uuid_str(bytes(self._binary_data[self._offset:self._offset + 16]))
         self._offset += 16
-        asset_uuid = uuid.UUID(
-            fields=(
-                fields[0],
-                fields[1],
-                fields[2],
-                fields[3],
-                fields[4],
-                int.from_bytes(fields[5:], byteorder="big")
-            )
-        )
-        return str(asset_uuid)
+        return result
+
+    def _unpack_record(self, record: TSRecord) -> dict:
+        """
+        Unpacks a fixed-width record.
+
+        Args:
+            record: The record schema to unpack.
+
+        Returns:
+            dict: The field values by name.
+        """
+        result = record.unpack_from(self._binary_data, self._offset)
+        self._offset += record.size
+        return result
 
     def _pack_u8(self, value: int) -> None:
         """
@@ -146,7 +370,7 @@ class TSCodingBase:
         Args:
             value: The integer value to pack.
         """
-        self._binary_data.extend(struct.pack("<B", value))
+        _U8.pack_into(self._binary_data, self._reserve(1), value)
 
     def _pack_u16(self, value: int) -> None:
         """
@@ -155,7 +379,7 @@ class TSCodingBase:
         Args:
             value: The integer value to pack.
         """
-        self._binary_data.extend(struct.pack("<H", value))
+        _U16.pack_into(self._binary_data, self._reserve(2), value)
 
     def _pack_u32(self, value: int) -> None:
         """
@@ -164,7 +388,7 @@ class TSCodingBase:
         Args:
             value: The integer value to pack.
         """
-        self._binary_data.extend(struct.pack("<I", value))
+        _U32.pack_into(self._binary_data, self._reserve(4), value)
 
     def _pack_u64(self, value: int) -> None:
         """
@@ -173,7 +397,7 @@ class TSCodingBase:
         Args:
             value: The integer value to pack.
         """
-        self._binary_data.extend(struct.pack("<Q", value))
+        _U64.pack_into(self._binary_data, self._reserve(8), value)
 
     def _pack_uuid(self, uuid_str: str) -> None:
         """
@@ -182,7 +406,7 @@ class TSCodingBase:
         Args:
             uuid_str: The UUID string.
         """
-        self._binary_data.extend(uuid.UUID(uuid_str).bytes)
+        self._pack_bytes(UUID_CACHE.uuid_bytes(uuid_str))
 
     def _pack_slab_uuid(self, uuid_str: str):
         """
@@ -191,14 +415,28 @@ class TSCodingBase:
         Args:
             uuid_str: The UUID String.
         """
-        fields = uuid.UUID(uuid_str).fields
+        self._pack_bytes(UUID_CACHE.slab_uuid_bytes(uuid_str))
+
+    def _pack_record(self, record: TSRecord, values: dict) -> None:
+        """
+        Packs a fixed-width record.
+
+        Args:
+            record: The record schema to pack.
+            values: The field values by name.
+        """
+        record.pack_into(self._binary_data, self._reserve(record.size), values)
 
-        node_bytes = fields[5].to_bytes(6, byteorder="big")
+    def _pack_bytes(self, data) -> None:
+        """
+        Packs raw bytes.
 
-        self._binary_data.extend(struct.pack(
-            "<IHH8B",
-            fields[0], fields[1], fields[2], fields[3], fields[4], *node_bytes
-        ))
+        Args:
+            data: Any buffer-protocol object, it is written as bytes.
+        """
+        data = memoryview(data).cast("B")
+        offset = self._reserve(len(data))
+        self._binary_data[offset:self._offset] = data
 
     def _pack_i32(self, value: int):
         """
@@ -207,4 +445,39 @@ class TSCodingBase:
         Args:
             value: The integer to pack.
         """
-        self._binary_data.extend(struct.pack("<i", value))
+        _I32.pack_into(self._binary_data, self._reserve(4), value)
+
+
+def map_batch(func: Callable, items: Iterable, workers: int | None = None, chunksize: int | None = None,
+              use_threads: bool = False) -> list:
+    """
+    Map a function over items with a process pool, the results are returned in the same order as the items.
+    The function must be a picklable module level function, errors should be caught and returned by it
+    so that a single bad item does not abort the whole batch.
+
+    Args:
+        func: The function to call for each item.
+        items: The items to process.
+        workers: The number of worker processes, defaults to the number of CPUs. 1 runs in this process.
+        chunksize: The number of items sent to a worker at a time, by default the items are split
+            into roughly 4 chunks per worker.
+        use_threads: Use a thread pool instead of a process pool, this suits work that mostly waits on I/O.
+            The default number of workers is then the number of CPUs + 4, up to 32.
+    """
+    items = list(items)
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) + 4) if use_threads else os.cpu_count() or 1
+    workers = min(workers, len(items))
+
+    if workers <= 1:
+        return [func(item) for item in items]
+
+    if use_threads:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, items))
+
+    if chunksize is None:
+        chunksize = math.ceil(len(items) / (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items, chunksize=chunksize))
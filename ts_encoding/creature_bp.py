@@ -3,11 +3,27 @@ Encoding Schemes for TaleSpire Blueprints
 The blueprint url scheme is documented here:
 https://talespire.com/url-scheme
 """
+from __future__ import annotations
 
-import base64
 import struct
 
-from ts_encoding.common import TSCodingBase
+from functools import partial
+from typing import Iterable
+
+from ts_encoding.common import TSCodingBase, TSRecord, map_batch
+
+# The fixed-width records of the blueprint format.
+_MORPH_ID_V1 = TSRecord(("morph_id", "uuid"))
+_MORPH_ID_V2 = TSRecord(("content_pack_index", "i"), ("morph_id", "uuid"))  # Content pack index is in v2+.
+_FIXED_BLOCK = TSRecord(
+    ("active_morph_index", "B"),
+    ("packed_morph_scales", "Q"),
+    ("reserved0", "8H"),
+    ("reserved1", "3B"),
+    ("stats", "18f"),  # HP plus 8 assignable stats, each is a value and a max value.
+    ("state", "B"),  # The torch, hide, and fly states.
+)
+_SLOT_OVERRIDE = TSRecord(("id", "uuid"), ("index", "H"))
 
 
 class TSCreature(TSCodingBase):
@@ -36,19 +52,24 @@ class TSCreature(TSCodingBase):
             "active_emote_ids": [],
         }
 
-    def decode_url(self, url: str) -> None:
+    def decode_url(self, url: str | bytes | bytearray | memoryview) -> None:
         """
         Decode a Creature Blueprint URL into the `data` attribute.
 
         Args:
             url: The Creature Blueprint URL as copied from a TaleSpire Creature.
+                This can be a string or any buffer-protocol object containing the ascii URL.
         """
         # Extract just the code from the URL, this is the last element after splitting via "/"
         # Then replace "_" with "/" after extracting the code.
         #  This was likely done so the URL could be formed properly, the encoded string may contain "/" characters
         #  which are swapped to "_" characters which must not be used by base64 encoding.
         #  So they need to be swapped back.
-        self._code = url.split("/")[-1].replace("_", "/")  # The code is stored if needed later.
+        if not isinstance(url, str):
+            url = memoryview(url).tobytes()
+            self._code = url.split(b"/")[-1].replace(b"_", b"/")
+        else:
+            self._code = url.split("/")[-1].replace("_", "/")  # The code is stored if needed later.
         self._decode()
 
     def _decode_steps(self) -> None:
@@ -62,11 +83,7 @@ class TSCreature(TSCodingBase):
         self._decode_name()
         self._decode_content_packs()
         self._decode_morph_ids()
-        self.data["active_morph_index"] = self._unpack_u8()  # Unpack and store the active morph index.
-        self._decode_morph_scales()
-        self._decode_reserved()
-        self._decode_stats()
-        self._decode_torch_hide_fly()
+        self._decode_fixed_block()
         self._decode_slot_overrides()
         self._decode_active_emote_ids()
 
@@ -81,7 +98,7 @@ class TSCreature(TSCodingBase):
             raise ValueError("number-of-stats exceeds 150")
 
         # Set the extracted name.
-        self.data["name"] = self._unpack_utf8(num_bytes).decode()
+        self.data["name"] = self._unpack_utf8(num_bytes)
 
     def _decode_content_packs(self) -> None:
         """
@@ -95,7 +112,7 @@ class TSCreature(TSCodingBase):
         content_pack_uris = []
         for _ in range(num_content_packs):
             byte_count = self._unpack_u16()
-            uri = self._unpack_utf8(byte_count).decode()
+            uri = self._unpack_utf8(byte_count)
             content_pack_uris.append(uri)
 
         # Set the extracted content_packs
@@ -106,24 +123,34 @@ class TSCreature(TSCodingBase):
         Decode the Morph IDs, there is always at least one of these, the active ID of the creature.
         """
         num_morph_ids = self._unpack_u8()  # Get the number of Morph IDs, there should be at least 1.
-        content_pack_index = None
+        morph_record = _MORPH_ID_V2 if self._version > 1 else _MORPH_ID_V1
         morph_ids = []
         for _ in range(num_morph_ids):
-            if self._version > 1:  # Content pack index os only in v2+ of the schema.
-                content_pack_index = self._unpack_i32()
-            morph_id = self._unpack_uuid()
-            morph_ids.append((content_pack_index, morph_id))
+            morph = self._unpack_record(morph_record)
+            morph_ids.append((morph.get("content_pack_index"), morph["morph_id"]))
 
         # Set the extracted morph_ids
         self.data["morph_ids"] = morph_ids
 
-    def _decode_morph_scales(self) -> None:
+    def _decode_fixed_block(self) -> None:
         """
-        Decode the Morph Scales, this is the scale of the creature for each morph depicted.
+        Decodes the fixed size block following the morph ids.
+        This is the active morph index, morph scales, reserved values, stats and the torch, hide, and fly states.
         """
-        # Parse the packed-morph-scales (u64)
-        packed_morph_scales = self._unpack_u64()
+        block = self._unpack_record(_FIXED_BLOCK)
+        self.data["active_morph_index"] = block["active_morph_index"]
+        self._decode_morph_scales(block["packed_morph_scales"])
+        self._decode_reserved(block["reserved0"], block["reserved1"])
+        self._decode_stats(block["stats"])
+        self._decode_torch_hide_fly(block["state"])
 
+    def _decode_morph_scales(self, packed_morph_scales: int) -> None:
+        """
+        Decode the Morph Scales, this is the scale of the creature for each morph depicted.
+
+        Args:
+            packed_morph_scales: The packed-morph-scales (u64)
+        """
         morph_scales = []
         for n in range(10):  # Up to 10 morphs
             # Extract the nth 6-bit segment
@@ -135,41 +162,42 @@ class TSCreature(TSCodingBase):
         # Set the extracted scales
         self.data["morph_scales"] = morph_scales
 
-    def _decode_reserved(self) -> None:
+    def _decode_reserved(self, reserved0: tuple, reserved1: tuple) -> None:
         """
         Decodes the reserved values in the creature.
         No Idea what these are for.
+
+        Args:
+            reserved0: 8 u16 values.
+            reserved1: 3 u8 values.
         """
-        reserved0 = struct.unpack_from("<8H", self._binary_data, self._offset)  # Unpack 8 u16 values
-        self._offset += 16
-        # Store the u16 values in "reserved0" of the data
         self.data["reserved0"] = reserved0
-
-        reserved1 = struct.unpack_from("<3B", self._binary_data, self._offset)  # Unpack 3 u8 values
-        self._offset += 3
-        # Store the u16 values in "reserved0" of the data
         self.data["reserved1"] = reserved1
 
-    def _decode_stats(self) -> None:
+    def _decode_stats(self, stat_values: tuple) -> None:
         """
         Decodes the stats of the creature.
         The first value is the "hp" of the creature.
         The 8 additional values are as depicted in the campaign.
+
+        Args:
+            stat_values: The 18 stat floats, a value followed by a max value for each stat.
         """
         stats = []
-        for _ in range(9):  # HP plus 8 assignable stats.
-            value, v_max = self._unpack_stat()
+        for value, v_max in zip(stat_values[0::2], stat_values[1::2]):  # HP plus 8 assignable stats.
             stats.append({"value": value, "max": v_max})  # Each stat has a value and a max value.
 
         # Set the extracted stats
         self.data["stats"] = stats
 
-    def _decode_torch_hide_fly(self) -> None:
+    def _decode_torch_hide_fly(self, state: int) -> None:
         """
         Decode the bits for the torch, hide, and fly states.
         These are stored in a single byte (u8) where each bit represents a specific state.
+
+        Args:
+            state: The state byte.
         """
-        state = self._unpack_u8()  # Extract the byte
         self.data["torch_enabled"] = bool(state & 0b00000001)  # Mask for bit 0
         self.data["explicitly_hidden"] = bool(state & 0b00000010)  # Mask for bit 1
         self.data["flying_enabled"] = bool(state & 0b00000100)  # Mask for bit 2
@@ -188,10 +216,9 @@ class TSCreature(TSCodingBase):
 
         slot_overrides = []
         for _ in range(num_overrides):
-            slot_id = self._unpack_uuid()  # UUID of the slot
-            slot_index = self._unpack_u16()  # Index of the slot
+            # The UUID and index of the slot.
             # Until we figure out what these do they are just being stored in a dictionary
-            slot_overrides.append({"id": slot_id, "index": slot_index})
+            slot_overrides.append(self._unpack_record(_SLOT_OVERRIDE))
 
         # Set the extracted slot overrides.
         self.data["slot_overrides"] = slot_overrides
@@ -210,36 +237,34 @@ class TSCreature(TSCodingBase):
         # Set the active emote ids
         self.data["active_emote_ids"] = active_emote_ids
 
-    def _unpack_stat(self) -> (float, float):
-        """
-        Unpacks a stat, this is stored as two 32-bit floats.
-
-        Returns:
-            tuple: A tuple containing two floats ( Value, Max Value )
-        """
-        value, v_max = struct.unpack_from("<ff", self._binary_data, self._offset)
-        self._offset += 8
-        return value, v_max
-
-    def _encode(self) -> None:
+    def _binary_size(self) -> int:
+        """The exact size in bytes of the encoded blueprint, this is used to allocate the binary data once."""
+        size = 2  # Version
+        if self.data["name"]:
+            size += len(self.data["name"].encode("utf-8"))
+        size += 1  # Name length
+        if self._encode_version > 1:
+            size += 4 + sum(2 + len(uri.encode("utf-8")) for uri in self.data["content_packs"])
+        morph_record = _MORPH_ID_V2 if self._encode_version > 1 else _MORPH_ID_V1
+        size += 1 + morph_record.size * len(self.data["morph_ids"])
+        size += _FIXED_BLOCK.size
+        size += 1 + _SLOT_OVERRIDE.size * len(self.data["slot_overrides"])
+        size += 1 + 16 * len(self.data["active_emote_ids"])
+        return size
+
+    def _encode_steps(self) -> None:
         """
         The steps to encode the data.
         Each step is broken down to a single line or method for ease of debugging and updating the schema.
         After this is run the entire blueprint should be encoded and stored in `self.binary_data`.
         """
-        self._binary_data = bytearray()
-
         version = self.data["version"]
 
         self._pack_u16(version)
         self._encode_name()
         self._encode_content_packs()
         self._encode_morph_ids()
-        self._pack_u8(self.data["active_morph_index"])
-        self._encode_morph_scales()
-        self._encode_reserved()
-        self._encode_stats()
-        self._encode_torch_hide_fly()
+        self._encode_fixed_block()
         self._encode_slot_overrides()
         self._encode_active_emote_ids()
 
@@ -260,7 +285,7 @@ class TSCreature(TSCodingBase):
         elif match_input_version:
             self._encode_version = self._version
         self._encode()
-        encoded_data = base64.b64encode(bytes(self._binary_data)).decode().replace("/", "_")
+        encoded_data = self._code.decode().replace("/", "_")
         url = f"talespire://creature-blueprint/{encoded_data}"
         return url
 
@@ -274,7 +299,7 @@ class TSCreature(TSCodingBase):
 
         encoded_name = name.encode("utf-8")
         self._pack_u8(len(encoded_name))
-        self._binary_data.extend(encoded_name)
+        self._pack_bytes(encoded_name)
 
     def _encode_content_packs(self) -> None:
         """Encodes and packs the content packs into the binary data."""
@@ -291,51 +316,60 @@ class TSCreature(TSCodingBase):
                 raise ValueError(f"URI exceeds 65535 bytes: {uri}")
 
             self._pack_u16(len(encoded_uri))
-            self._binary_data.extend(encoded_uri)
+            self._pack_bytes(encoded_uri)
 
     def _encode_morph_ids(self) -> None:
         """Packs the morph ids into the binary data."""
         morph_ids = self.data["morph_ids"]
+        morph_record = _MORPH_ID_V2 if self._encode_version > 1 else _MORPH_ID_V1
         self._pack_u8(len(morph_ids))
         for content_pack_index, morph_id in morph_ids:
-            if self._encode_version > 1:
-                self._pack_i32(content_pack_index)
-            self._pack_uuid(morph_id)
+            self._pack_record(morph_record, {"content_pack_index": content_pack_index, "morph_id": morph_id})
 
-    def _encode_morph_scales(self) -> None:
-        """Packs the morph scales into the binary data."""
+    def _encode_fixed_block(self) -> None:
+        """
+        Packs the fixed size block following the morph ids into the binary data.
+        This is the active morph index, morph scales, reserved values, stats and the torch, hide, and fly states.
+        """
+        self._pack_record(_FIXED_BLOCK, {
+            "active_morph_index": self.data["active_morph_index"],
+            "packed_morph_scales": self._encode_morph_scales(),
+            "reserved0": self.data["reserved0"],
+            "reserved1": self.data["reserved1"],
+            "stats": self._encode_stats(),
+            "state": self._encode_torch_hide_fly(),
+        })
+
+    def _encode_morph_scales(self) -> int:
+        """Encodes the morph scales as the packed-morph-scales (u64)."""
         packed_morph_scales = 0
         for i, scale in enumerate(self.data["morph_scales"]):
             scale_bits = int(scale * 4) & 0b111111
             packed_morph_scales |= (scale_bits << (i * 6))
-        self._binary_data.extend(struct.pack("<Q", packed_morph_scales))
-
-    def _encode_reserved(self) -> None:
-        """Packs the reserved data into the binary data."""
-        reserved = self.data["reserved0"] + self.data["reserved1"]
-        self._binary_data.extend(struct.pack("<8H3B", *reserved))
+        return packed_morph_scales
 
-    def _encode_stats(self) -> None:
-        """Packs the stats value and max values into the binary data."""
+    def _encode_stats(self) -> list[float]:
+        """Encodes the stats as a flat list of the value and max value of each stat."""
+        stat_values = []
         for stat in self.data["stats"]:
-            self._pack_stat((stat["value"], stat["max"]))
+            stat_values.extend((stat["value"], stat["max"]))
+        return stat_values
 
-    def _encode_torch_hide_fly(self) -> None:
-        """Encodes and packs the Torch, Hide, and Fly states into the binary data."""
+    def _encode_torch_hide_fly(self) -> int:
+        """Encodes the Torch, Hide, and Fly states as a single byte."""
         state = (
                 (1 if self.data["torch_enabled"] else 0) |
                 (2 if self.data["explicitly_hidden"] else 0) |
                 (4 if self.data["flying_enabled"] else 0)
         )
-        self._pack_u8(state)
+        return state
 
     def _encode_slot_overrides(self) -> None:
         """Packs the slot overrides into the binary data."""
         slot_overrides = self.data["slot_overrides"]
         self._pack_u8(len(slot_overrides))
         for slot in slot_overrides:
-            self._pack_uuid(slot["id"])
-            self._pack_u16(slot["index"])
+            self._pack_record(_SLOT_OVERRIDE, slot)
 
     def _encode_active_emote_ids(self) -> None:
         """Packs the active emote ids into the binary_data."""
@@ -344,12 +378,64 @@ class TSCreature(TSCodingBase):
         for emote_id in active_emote_ids:
             self._pack_uuid(emote_id)
 
-    def _pack_stat(self, stat_tuple: (float, float)) -> None:
-        """
-        Packs a stat, as two 32-bit floats.
 
-        Args:
-            stat_tuple: A tuple containing two floats ( Value, Max Value )
-        """
-        value, v_max = stat_tuple
-        self._binary_data.extend(struct.pack("<ff", value, v_max))
+def decode_blueprints(urls: Iterable[str], workers: int | None = None,
+                      chunksize: int | None = None) -> list[dict | Exception]:
+    """
+    Decode many Creature Blueprint URLs across a pool of worker processes.
+    A URL that fails to decode does not stop the batch, its exception is returned in its place.
+
+    Args:
+        urls: The Creature Blueprint URLs as copied from TaleSpire Creatures.
+        workers: The number of worker processes, defaults to the number of CPUs. 1 decodes in this process.
+        chunksize: The number of URLs sent to a worker at a time.
+
+    Returns:
+        list: The decoded `data` dictionary or the raised exception for each URL, in the same order.
+    """
+    return map_batch(_decode_blueprint_item, urls, workers, chunksize)
+
+
+def encode_blueprints(data_dicts: Iterable[dict], workers: int | None = None, match_input_version: bool = True,
+                      force_encode_version: int | None = None, chunksize: int | None = None) -> list[str | Exception]:
+    """
+    Encode many blueprint `data` dictionaries to Creature Blueprint URLs across a pool of worker processes.
+    A blueprint that fails to encode does not stop the batch, its exception is returned in its place.
+
+    Args:
+        data_dicts: The blueprint dictionaries, in the same form as `TSCreature.data`.
+        workers: The number of worker processes, defaults to the number of CPUs. 1 encodes in this process.
+        match_input_version: Blueprint version will match the version set in each dictionary.
+            If set to False it will use the latest blueprint version.
+        force_encode_version: Force the blueprints to be in a specific version (1 or 2).
+        chunksize: The number of blueprints sent to a worker at a time.
+
+    Returns:
+        list: The Creature Blueprint URL or the raised exception for each blueprint, in the same order.
+    """
+    encode_item = partial(
+        _encode_blueprint_item, match_input_version=match_input_version, force_encode_version=force_encode_version
+    )
+    return map_batch(encode_item, data_dicts, workers, chunksize)
+
+
+def _decode_blueprint_item(url: str) -> dict | Exception:
+    """Decode a single blueprint for `decode_blueprints`, returning the exception if it fails."""
+    creature = TSCreature()  # One per item, a shared creature would not be safe to use from threads.
+    try:
+        creature.decode_url(url)
+    except (ValueError, struct.error) as e:
+        return e
+    return creature.data
+
+
+def _encode_blueprint_item(data: dict, match_input_version: bool = True,
+                           force_encode_version: int | None = None) -> str | Exception:
+    """Encode a single blueprint for `encode_blueprints`, returning the exception if it fails."""
+    creature = TSCreature()
+    creature.data = data
+    creature._version = data.get("version", creature._version)
+    try:
+        return creature.encode_url(match_input_version, force_encode_version)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        return e
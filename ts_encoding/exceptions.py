@@ -21,6 +21,14 @@ class UnsupportedSlabVersion(TSEncodingException):
     """Raised when the slab is an unsupported version."""
     pass
 
+class SlabPositionOutOfRange(TSEncodingException):
+    """Raised when a slab transform would move instances outside of the positions a v2 slab can store."""
+    pass
+
+class SlabPatchConflict(TSEncodingException):
+    """Raised when a slab patch removes instances that are not in the slab it is applied to."""
+    pass
+
 # Asset Exceptions
 class InvalidTaleSpireDirectory(TSEncodingException):
     """Raised when the TaleSpire directory can not be found."""
@@ -29,3 +37,14 @@ class InvalidTaleSpireDirectory(TSEncodingException):
 class InvalidAssetType(TSEncodingException):
     """Raised when an invalid asset type is requested or found."""
     pass
+
+class InvalidAssetIndex(TSEncodingException):
+    """Raised when an asset index file fails to read, the path of the file is stored in `path`."""
+
+    def __init__(self, message: str, path: str = ""):
+        super().__init__(message)
+        self.path = path
+
+    def __reduce__(self):
+        # The cause is kept so the original parse error survives being sent back from a worker process.
+        return type(self), (self.args[0], self.path), {"__cause__": self.__cause__}
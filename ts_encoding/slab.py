@@ -4,172 +4,852 @@ v2 of this format is documented here:
 https://github.com/Bouncyrock/DumbSlabStats/blob/master/format.md
 
 v1 of the format was pieced together from various other projects.
+
+Decoded slabs are stored in a columnar form, each layout keeps its instances in contiguous arrays
+(see `TSSlabLayout`). The familiar `TSSlab.data` dictionary is only built when it is accessed.
 """
 from __future__ import annotations
 
+import base64
 import gzip
+import hashlib
+import math
 import struct
+import sys
+import zlib
+
+from array import array
+from collections import Counter
+from functools import partial
+from typing import Callable, Iterable, Iterator
 
-from ts_encoding.common import TSCodingBase
-from ts_encoding import SlabExceedsSizeLimit, BadSlabCode, UnsupportedSlabVersion
+from ts_encoding.common import TSCodingBase, TSRecord, map_batch
+from ts_encoding.exceptions import TSEncodingException
+from ts_encoding.spatial import TSSlabSpatialIndex
+from ts_encoding import (
+    SlabExceedsSizeLimit, BadSlabCode, UnsupportedSlabVersion, SlabPositionOutOfRange, SlabPatchConflict
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, it is only needed for the vectorized code paths.
+    np = None
 
 DEFAULT_SLAB_VERSION = 2 # This is the default version of new slabs being created.
 SLAB_VERSIONS = [1,2] # List of supported versions
 SLAB_MAGIC_NUM = 3520002766
 SLAB_SIZE_LIMIT = 30720 # The limit in kB that a slab can be encoded as.
+SLAB_MAX_POSITION = 0x3FFFF / 100.0  # The largest position a v2 slab can store, positions are 18 bits in 0.01 steps.
+_FLOAT32_MAX = 3.4028234663852886e38  # The largest position a v1 slab can store.
+
+# The extra flags byte of the gzip header of a code compressed at the fastest level.
+_GZIP_FAST_FLAGS = 4
+
+# The gzip compression level used by each compression profile when encoding slabs.
+COMPRESSION_PROFILES = {
+    "fast": 1,  # For previews and checking if a slab fits, the size will be larger than the final export.
+    "default": 6,
+    "max": 9,  # For the final export, this is the slowest and the smallest.
+}
+
+# The cell itself and the 13 neighbouring cells that come after it, so each pair of neighbouring cells is seen once.
+_NEIGHBOUR_STEPS = [
+    (step_x, step_y, step_z)
+    for step_x in (-1, 0, 1) for step_y in (-1, 0, 1) for step_z in (-1, 0, 1)
+    if (step_x, step_y, step_z) >= (0, 0, 0)
+]
+
+# Every byte that is not part of the base64 alphabet.
+_NON_BASE64 = bytes(set(range(256)) - set(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="))
+
+# The fixed-width records of the slab format.
+_SLAB_PREAMBLE = TSRecord(("magic_num", "I"), ("version", "H"))
+_SLAB_COUNTS_V1 = TSRecord(("layout_count", "H"))
+_SLAB_COUNTS_V2 = TSRecord(("layout_count", "H"), ("num_creatures", "H"))  # Number of Creatures is in v2 and higher.
+_SLAB_LAYOUT = TSRecord(("uuid", "slab_uuid"), ("instance_count", "H"), ("reserved", "H"))
+# A v1 instance is 28 bytes: pos (3 floats), size (3 floats), rotation (u8) and 3 bytes of padding.
+_SLAB_INSTANCE_V1 = TSRecord(("pos", "3f"), ("size", "3f"), ("rot", "B"), (None, "3x"))
+_V1_INSTANCE = _SLAB_INSTANCE_V1.struct  # The instances are read in bulk with the struct directly.
+
+# The records of a slab patch code, each layout record is followed by its removed then its added packed transforms.
+_PATCH_MAGIC_NUM = 0x48435450  # "PTCH"
+_PATCH_HEADER = TSRecord(("magic_num", "I"), ("num_creatures", "H"), ("layout_count", "H"))
+_PATCH_LAYOUT = TSRecord(("uuid", "slab_uuid"), ("removed_count", "I"), ("added_count", "I"))
+
+if np is not None:
+    _V1_INSTANCE_DTYPE = np.dtype([
+        ("pos", "<f4", 3),
+        ("size", "<f4", 3),
+        ("rot", "u1"),
+        ("pad", "V3"),
+    ])
+
+
+# The columns of a `TSSlabLayout`, in the order they are hashed.
+_LAYOUT_COLUMNS = ("pos_x", "pos_y", "pos_z", "degrees", "size_x", "size_y", "size_z")
+
+
+def _column_property(name: str) -> property:
+    """A column of `TSSlabLayout`, fetching or replacing it forgets the digest of the layout as it may be edited."""
+    attr = "_" + name
+
+    def get(self) -> array:
+        self._known_digest = None
+        return self.__dict__[attr]
+
+    def set(self, column: array) -> None:
+        self._known_digest = None
+        self.__dict__[attr] = column
+
+    return property(get, set, doc=f"The {name} column of the instances.")
+
+
+class TSSlabLayout:
+    """
+    The columnar storage for a single slab layout (one asset UUID).
+
+    Every instance attribute is kept in its own contiguous `array.array("d")` instead of a dictionary per instance.
+    The size columns are only filled for v1 slabs, v2 slabs do not store the size of an instance.
+
+    Fetching a column marks the layout as possibly edited, `TSSlab.data` only hashes the layouts again whose
+    columns were fetched since it last checked them. Edits made later through a column or a NumPy view that was
+    fetched before then are seen by the next encode, which always hashes every layout.
+    """
+
+    pos_x = _column_property("pos_x")
+    pos_y = _column_property("pos_y")
+    pos_z = _column_property("pos_z")
+    degrees = _column_property("degrees")
+    size_x = _column_property("size_x")
+    size_y = _column_property("size_y")
+    size_z = _column_property("size_z")
+
+    def __init__(self, uuid: str, reserved: int = 0):
+        """
+        Args:
+            uuid: The asset UUID of the layout.
+            reserved: The reserved value stored with the layout, this should be 0 for new layouts.
+        """
+        self.uuid = uuid
+        self.reserved = reserved
+        self.pos_x = array("d")
+        self.pos_y = array("d")
+        self.pos_z = array("d")
+        self.degrees = array("d")
+        self.size_x = array("d")
+        self.size_y = array("d")
+        self.size_z = array("d")
+        self._known_digest = None  # The digest if no column was fetched since it was computed, see `_digest`.
+
+    def __len__(self) -> int:
+        return len(self._pos_x)
+
+    @property
+    def has_size(self) -> bool:
+        """True if the instances of this layout store a size (v1 slabs)."""
+        return len(self._pos_x) > 0 and len(self._size_x) == len(self._pos_x)
+
+    def append(self, pos_x: float, pos_y: float, pos_z: float, degrees: float,
+               size: tuple[float, float, float] | None = None) -> None:
+        """
+        Append a single instance to the layout.
+
+        Args:
+            pos_x: X position within the slab.
+            pos_y: Y position within the slab.
+            pos_z: Z position within the slab.
+            degrees: Yaw rotation in degrees.
+            size: The (x, y, z) size of the instance, only used by v1 slabs.
+        """
+        self.pos_x.append(pos_x)
+        self.pos_y.append(pos_y)
+        self.pos_z.append(pos_z)
+        self.degrees.append(degrees)
+        if size is not None:
+            self.size_x.append(size[0])
+            self.size_y.append(size[1])
+            self.size_z.append(size[2])
+
+    def instance(self, n: int) -> dict:
+        """
+        Return instance `n` as a dictionary in the same form as `TSSlab.data`.
+
+        Args:
+            n: The index of the instance within the layout.
+        """
+        if self.has_size:
+            return {
+                "pos_x": self.pos_x[n],
+                "pos_y": self.pos_y[n],
+                "pos_z": self.pos_z[n],
+                "size_x": self.size_x[n],
+                "size_y": self.size_y[n],
+                "size_z": self.size_z[n],
+                "degrees": self.degrees[n]
+            }
+        return {
+            "degrees": self.degrees[n],
+            "pos_x": self.pos_x[n],
+            "pos_y": self.pos_y[n],
+            "pos_z": self.pos_z[n]
+        }
+
+    def instances(self) -> list[dict]:
+        """Return all the instances as a list of dictionaries."""
+        if self.has_size:
+            return [
+                {
+                    "pos_x": x,
+                    "pos_y": y,
+                    "pos_z": z,
+                    "size_x": sx,
+                    "size_y": sy,
+                    "size_z": sz,
+                    "degrees": d
+                }
+                for x, y, z, sx, sy, sz, d in zip(
+                    self.pos_x, self.pos_y, self.pos_z, self.size_x, self.size_y, self.size_z, self.degrees
+                )
+            ]
+        return [
+            {
+                "degrees": d,
+                "pos_x": x,
+                "pos_y": y,
+                "pos_z": z
+            }
+            for d, x, y, z in zip(self.degrees, self.pos_x, self.pos_y, self.pos_z)
+        ]
+
+    def to_dict(self) -> dict:
+        """Return the layout as a dictionary in the same form as `TSSlab.data["layouts"]`."""
+        return {
+            "uuid": self.uuid,
+            "instance_count": len(self),
+            "reserved": self.reserved,
+            "instances": self.instances()
+        }
+
+    def _tracked_dict(self, edits: _DataEdits) -> _TrackedDict:
+        """The same as `to_dict`, but every dictionary and list of it records its edits in `edits`."""
+        if self.has_size:
+            instances = [
+                _TrackedDict(pos_x=x, pos_y=y, pos_z=z, size_x=sx, size_y=sy, size_z=sz, degrees=d)
+                for x, y, z, sx, sy, sz, d in zip(
+                    self.pos_x, self.pos_y, self.pos_z, self.size_x, self.size_y, self.size_z, self.degrees
+                )
+            ]
+        else:
+            instances = [
+                _TrackedDict(degrees=d, pos_x=x, pos_y=y, pos_z=z)
+                for d, x, y, z in zip(self.degrees, self.pos_x, self.pos_y, self.pos_z)
+            ]
+        for instance in instances:
+            instance._edits = edits
+        layout = {"uuid": self.uuid, "instance_count": len(self), "reserved": self.reserved,
+                  "instances": _tracked(_TrackedList, instances, edits)}
+        return _tracked(_TrackedDict, layout, edits)
+
+    @classmethod
+    def from_dict(cls, layout: dict) -> TSSlabLayout:
+        """
+        Build a columnar layout from a layout dictionary as found in `TSSlab.data["layouts"]`.
+
+        Args:
+            layout: The layout dictionary.
+        """
+        new_layout = cls(layout["uuid"], layout.get("reserved", 0))
+        instances = layout["instances"]
+        new_layout.pos_x.extend(data["pos_x"] for data in instances)
+        new_layout.pos_y.extend(data["pos_y"] for data in instances)
+        new_layout.pos_z.extend(data["pos_z"] for data in instances)
+        new_layout.degrees.extend(data["degrees"] for data in instances)
+        if instances and "size_x" in instances[0]:
+            new_layout.size_x.extend(data["size_x"] for data in instances)
+            new_layout.size_y.extend(data["size_y"] for data in instances)
+            new_layout.size_z.extend(data["size_z"] for data in instances)
+        return new_layout
+
+    def select(self, indices: Iterable[int]) -> None:
+        """
+        Keep only the instances at the given indices, in the order given.
+
+        Args:
+            indices: The indices of the instances to keep.
+        """
+        indices = list(indices)
+        for name in _LAYOUT_COLUMNS:
+            column = getattr(self, name)
+            if len(column):
+                setattr(self, name, array("d", map(column.__getitem__, indices)))
+
+    def _digest(self) -> bytes:
+        """
+        A hash of every column, any edit to the instances changes it.
+        The columns are hashed straight from their buffers, this is much faster than packing them.
+        The digest is kept until a column is next fetched, see `_cached_digest`.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for name in _LAYOUT_COLUMNS:
+            column = self.__dict__["_" + name]
+            digest.update(len(column).to_bytes(8, "little"))
+            digest.update(column)
+        self._known_digest = digest.digest()
+        return self._known_digest
+
+    def _cached_digest(self) -> bytes:
+        """
+        The digest of the layout, the columns are only hashed again if one of them was fetched since the last
+        `_digest`. Edits made through a column fetched before then are missed, use `_digest` to see every edit.
+        """
+        if self._known_digest is None:
+            return self._digest()
+        return self._known_digest
+
+    def column(self, name: str):
+        """
+        Return a zero-copy NumPy view of a column, writes to the view change the layout.
+
+        Args:
+            name: The column name, for example "pos_x" or "degrees".
+        """
+        return np.frombuffer(getattr(self, name), dtype=np.float64)
 
 
 class TSSlab(TSCodingBase):
     """
     A Class to Decode and Encode a TaleSpire Slab.
+
+    The instances are stored per layout in `layouts` (a list of `TSSlabLayout`).
+    The `data` dictionary is built from them the first time it is accessed. Edits made to the dictionary or to
+    the layouts are both kept, but not edits made to both before the slab is next encoded or read.
     """
 
-    def __init__(self):
+    def __init__(self, use_numpy: bool = False):
+        """
+        Args:
+            use_numpy: Use the vectorized NumPy code paths, this requires NumPy to be installed.
+        """
         super().__init__()
         self._layout_count = 0
         self._force_version = None
+        self._compression_level = COMPRESSION_PROFILES["max"]
+        self._sort_instances = False
+        # The packed instances of each layout from the last encode, keyed by the layout digest and the settings
+        # that change how it is packed. Only the layouts that changed since the last encode are packed again.
+        self._packed_cache: dict[tuple, bytes] = {}
+        if use_numpy and np is None:
+            raise ImportError("use_numpy requires NumPy to be installed.")
+        self.use_numpy = use_numpy
+
+    def __getstate__(self) -> dict:
+        """
+        The reader of a header-only decode can not be pickled, `read_instance` needs a new header decode.
+        The encode caches are left out, they are built again by the next encode.
+        """
+        state = super().__getstate__()
+        state["_prefix_reader"] = None
+        state["_header_slab"] = None
+        state["_packed_cache"] = {}
+        state["_encoded"] = None
+        return state
 
     def _init_data(self) -> None:
         """Initializes the slab data to a default state."""
-        self.data = {
+        self._header = {
             "magic_num": SLAB_MAGIC_NUM,
             "version": DEFAULT_SLAB_VERSION,
-            "layout_count": 0,
             "num_creatures": 0,
-            "layouts": [],
         }
+        self.layouts: list[TSSlabLayout] = []
+        self._data = None
+        self._data_key = None  # The state of the layouts when `data` was built, see `_sync_columns`.
+        self._data_edits = None  # Records the edits to a `data` dictionary built by the slab, see `_sync_columns`.
+        self._prefix_reader = None
+        self._header_slab = None  # The slab decoded by `decode_slab_header`, used by `read_instance`.
+        # The slab state, encode settings and compressed data of the last decode or encode, see `_state_key`.
+        self._encoded = None
 
-    def decode_slab(self, slab_str) -> None:
+    @property
+    def data(self) -> dict:
+        """
+        The slab as a dictionary, this is built from the columnar layouts on first access
+        and built again if the layouts were edited since.
+        Only the layouts whose columns were fetched since the last access are hashed to find edits.
+        """
+        if self._data is not None and self._data_key is not None:
+            if _state_key(self._header, self.layouts, cached=True) != self._data_key:
+                self._sync_columns()
+        if self._data is None:
+            edits = self._data_edits = _DataEdits()
+            self._data = _tracked(_TrackedDict, {
+                "magic_num": self._header["magic_num"],
+                "version": self._header["version"],
+                "layout_count": len(self.layouts),
+                "num_creatures": self._header["num_creatures"],
+                "layouts": _tracked(_TrackedList, [layout._tracked_dict(edits) for layout in self.layouts], edits),
+            }, edits)
+            self._data_key = _state_key(self._header, self.layouts, cached=True)
+        return self._data
+
+    @data.setter
+    def data(self, value: dict) -> None:
+        self._data = value
+        self._data_key = None  # A new dictionary replaces the layouts.
+        self._data_edits = None
+
+    def _sync_columns(self) -> None:
+        """
+        If the `data` dictionary has been built, bring the dictionary and the columnar layouts back in line.
+        When the dictionary was edited the layouts are rebuilt from it, when the layouts were edited the
+        dictionary is dropped and built again on the next access.
+        A dictionary built by the slab records its own edits, the layouts are only rebuilt from it to compare
+        them when it was edited. A dictionary set by the caller is always compared.
+
+        Raises:
+            ValueError: If both the dictionary and the layouts were edited since the dictionary was built.
+        """
+        if self._data is None:
+            return
+        edits = self._data_edits
+        if edits is not None and not edits.edited:
+            if _state_key(self._header, self.layouts, cached=True) != self._data_key:
+                self._data = None
+            return
+
+        header = {
+            "magic_num": self._data["magic_num"],
+            "version": self._data["version"],
+            "num_creatures": self._data.get("num_creatures", 0),
+        }
+        layouts = [TSSlabLayout.from_dict(layout) for layout in self._data["layouts"]]
+        data_key = _state_key(header, layouts)
+        columns_changed = (self._data_key is not None
+                           and _state_key(self._header, self.layouts, cached=True) != self._data_key)
+        if data_key == self._data_key:
+            if columns_changed:
+                self._data = None
+        elif columns_changed:
+            raise ValueError("The slab was edited through both `data` and `layouts`, only one of them can be edited "
+                             "between encodes.")
+        else:
+            self._header, self.layouts = header, layouts
+            self._data_key = data_key
+        if edits is not None:
+            edits.edited = False
+            if self._data is not None and not _is_tracked(self._data, edits):
+                self._data_edits = None  # A container added by the caller can not record its edits.
+
+    def decode_slab(self, slab_str: str | bytes | bytearray | memoryview, uuids: Iterable[str] | None = None) -> None:
         """
         Decode the given slab string.
 
         Args:
             slab_str: The slab string as copied from TaleSpire
+                This can be a string or any buffer-protocol object (bytes, bytearray, memoryview, mmap).
+            uuids: Only decode the layouts of these asset UUIDs, the other layouts are skipped and not stored.
+                The instances of the chosen layouts are found from the layout counts and the slab data is
+                only decompressed as far as the last chosen layout.
         """
-        self._code = slab_str.encode("ascii")
-        self._decode()
+        self._init_data()
+        try:
+            self._code = _code_buffer(slab_str)  # A non-ascii string raises a UnicodeEncodeError (a ValueError).
+            if uuids is None:
+                self._decode()
+            else:
+                self._decode_selected({uuid.lower() for uuid in uuids})
+        except (ValueError, struct.error) as e:  # Not ascii, bad base64 data or the slab data ended early.
+            raise BadSlabCode(f"Failed to read the slab code, corrupt code or not a TS Slab Code: {e}") from e
+        finally:
+            self._code = None  # The caller's buffer is not kept, it may be closed once the slab is decoded.
 
     def _decode_steps(self) -> None:
         """
         The steps to decode the data.
         Each step is broken down to a few lines or method for ease of debugging and updating the schema.
-        After this is run the entire slab should be decoded and stored in `self.data`.
+        After this is run the entire slab should be decoded and stored in `self.layouts`.
+        """
+        compressed = self._binary_data
+        self._decode_header()
+        self._decode_instances()
+        self._seed_encode_caches(compressed)
+
+    def _seed_encode_caches(self, compressed: memoryview) -> None:
+        """
+        Seed the encode caches from a full decode, encoding the slab before it is changed gives back the decoded
+        code and the first encode after an edit only packs the changed layouts.
+        The packed instances of each layout are views of the decompressed data, nothing is copied.
+        A code compressed at the fastest level is taken as a "fast" encode, any other code as a "max" encode.
+
+        Args:
+            compressed: The compressed data of the decoded code.
         """
+        instance_size = self._instance_size()
+        pack_settings = (self._version, (0, 0, 0), False)
+        self._packed_cache = {
+            (layout._digest(), pack_settings): self._binary_data[offset:offset + count * instance_size]
+            for layout, offset, count in zip(self.layouts, self._layout_offsets(), self._layout_counts)
+        }
+        fast = len(compressed) > 8 and compressed[8] == _GZIP_FAST_FLAGS
+        level = COMPRESSION_PROFILES["fast" if fast else "max"]
+        self._encoded = (_state_key(self._header, self.layouts, cached=True), (self._version, level, False), compressed)
+
+    def _decode_instances(self) -> None:
+        """Decode the instances of every layout in `self.layouts`, starting at the current offset."""
+        if self._version == 1:
+            if self.use_numpy:
+                self._decode_instances_v1_numpy()
+            else:
+                self._decode_instances_v1()
+        else:
+            if self.use_numpy:
+                self._decode_instances_v2_numpy()
+            else:
+                self._decode_instances_v2()
+
+    def _decode_header(self) -> None:
+        """Decompress the data and decode everything before the instances, this includes the layouts."""
         self._decompress_data()
-        self._decode_magic_number()
-        self._decode_version()
+        self._decode_counts()
+        self._decode_layouts()
 
-        self.data["layout_count"] = self._layout_count = self._unpack_u16()
+    def _decode_counts(self) -> None:
+        """Decode and verify the preamble, then the layout count and number of creatures."""
+        preamble = self._unpack_record(_SLAB_PREAMBLE)
+        self._verify_magic_number(preamble["magic_num"])
+        self._verify_version(preamble["version"])
 
-        if self._version > 1:
-            self.data["num_creatures"] = self._unpack_u16()  # Number of Creatures is in v2 and higher.
+        counts = self._unpack_record(_SLAB_COUNTS_V1 if self._version == 1 else _SLAB_COUNTS_V2)
+        self._layout_count = counts["layout_count"]
+        self._header["num_creatures"] = counts.get("num_creatures", 0)
 
+    def decode_slab_header(self, slab_str: str | bytes | bytearray | memoryview) -> dict:
+        """
+        Decode only the header and layouts of the given slab string, the instances are not decoded.
+        The slab code is decoded and decompressed in small chunks until the layouts have been read,
+        so the rest of the code is never decompressed.
+
+        The header is decoded into a separate slab, so a slab already decoded into this one is not changed.
+        Single instances can then be read with `read_instance`.
+
+        Args:
+            slab_str: The slab string as copied from TaleSpire, or any buffer-protocol object containing it.
+
+        Returns:
+            dict: The slab summary, the same as `data` but each layout only has its "uuid", "instance_count"
+                and "reserved".
+        """
+        header_slab = TSSlab()
+        try:
+            header_slab._code = _code_buffer(slab_str)
+            header_slab._decode_header_prefix()
+        except (ValueError, struct.error) as e:  # Not ascii, bad base64 data or the slab data ended early.
+            raise BadSlabCode(f"Failed to read the slab code, corrupt code or not a TS Slab Code: {e}") from e
+        finally:
+            header_slab._code = None
+        header_slab._prefix_reader.detach()  # The caller's buffer is not kept, the rest of the code is copied.
+        self._header_slab = header_slab
+
+        return {
+            "magic_num": header_slab._header["magic_num"],
+            "version": header_slab._header["version"],
+            "layout_count": header_slab._layout_count,
+            "num_creatures": header_slab._header["num_creatures"],
+            "layouts": [
+                {"uuid": layout.uuid, "instance_count": count, "reserved": layout.reserved}
+                for layout, count in zip(header_slab.layouts, header_slab._layout_counts)
+            ],
+        }
+
+    def _decode_header_prefix(self) -> None:
+        """Decode the header and layouts, only decompressing as much of the slab code as they need."""
+        self._prefix_reader = _SlabPrefixReader(self._code)
+        self._binary_data = self._prefix_reader.read(_SLAB_PREAMBLE.size + _SLAB_COUNTS_V2.size)
+        self._offset = 0
+        self._decode_counts()
+        self._binary_data = self._prefix_reader.read(self._offset + self._layout_count * _SLAB_LAYOUT.size)
         self._decode_layouts()
 
-        if self._version == 1:
-            self._decode_instances_v1()
-        else:
-            self._decode_instances_v2()
+    def _decode_selected(self, uuids: set[str]) -> None:
+        """
+        Decode the header and only the layouts with the given UUIDs.
+        The instance data of the chosen layouts is gathered into a new buffer that is decoded as a whole slab.
+        """
+        self._decode_header_prefix()
+        reader, self._prefix_reader = self._prefix_reader, None
+        instance_size = self._instance_size()
+        selected = [
+            (layout, count, offset)
+            for layout, count, offset in zip(self.layouts, self._layout_counts, self._layout_offsets())
+            if layout.uuid in uuids
+        ]
+        end = selected[-1][2] + selected[-1][1] * instance_size if selected else 0
+        view = memoryview(reader.read(end))
+        if len(view) < end:
+            raise struct.error(f"the instances require a buffer of at least {end} bytes")
+
+        self._binary_data = b"".join(view[offset:offset + count * instance_size] for layout, count, offset in selected)
+        self.layouts = [layout for layout, count, offset in selected]
+        self._layout_counts = [count for layout, count, offset in selected]
+        self._offset = 0
+        self._decode_instances()
+
+    def _instance_size(self) -> int:
+        """The size in bytes of a single instance for the slab version."""
+        return _V1_INSTANCE.size if self._version == 1 else 8
+
+    def _layout_offsets(self) -> list[int]:
+        """The offset of the first instance of each layout in the decompressed slab data."""
+        offsets = []
+        offset = _SLAB_PREAMBLE.size + (_SLAB_COUNTS_V1 if self._version == 1 else _SLAB_COUNTS_V2).size
+        offset += len(self._layout_counts) * _SLAB_LAYOUT.size
+        for count in self._layout_counts:
+            offsets.append(offset)
+            offset += count * self._instance_size()
+        return offsets
+
+    def read_instance(self, layout: int | str, n: int) -> dict:
+        """
+        Read a single instance straight from the slab data after `decode_slab_header`.
+        The instance is found from the layout counts, so no other instances are decoded and the slab code is
+        only decompressed as far as the instance.
+
+        Args:
+            layout: The index of the layout in the slab, or its asset UUID.
+            n: The index of the instance within the layout.
+
+        Returns:
+            dict: The instance in the same form as `data`.
+        """
+        header_slab = self._header_slab
+        if header_slab is None:
+            raise ValueError("read_instance requires a slab header to be decoded with decode_slab_header first.")
+        if isinstance(layout, str):
+            uuids = [slab_layout.uuid for slab_layout in header_slab.layouts]
+            if layout.lower() not in uuids:
+                raise KeyError(f"The slab has no layout for {layout}")
+            layout = uuids.index(layout.lower())
+        count = header_slab._layout_counts[layout]
+        if not 0 <= n < count:
+            raise IndexError(f"Instance {n} is out of range, the layout has {count} instances.")
+
+        instance_size = header_slab._instance_size()
+        offset = header_slab._layout_offsets()[layout] + n * instance_size
+        try:
+            data = header_slab._prefix_reader.read(offset + instance_size)
+            instance = TSSlabLayout(header_slab.layouts[layout].uuid)
+            if header_slab._version == 1:
+                record = _V1_INSTANCE.unpack_from(data, offset)
+                instance.append(record[0], record[1], record[2], record[6] * 22.5, record[3:6])
+            else:
+                packed, = struct.unpack_from("<Q", data, offset)
+                instance.append(
+                    (packed & 0x3FFFF) / 100.0,
+                    ((packed >> 18) & 0x3FFFF) / 100.0,
+                    ((packed >> 36) & 0x3FFFF) / 100.0,
+                    ((packed >> 54) & 0b11111) * 15.0
+                )
+        except struct.error as e:
+            raise BadSlabCode(f"Failed to read the slab code, corrupt code or not a TS Slab Code: {e}") from e
+        return instance.instance(0)
+
+    def iter_instances(self, slab_str: str | bytes | bytearray | memoryview
+                       ) -> Iterator[tuple[str, float, float, float, float]]:
+        """
+        Decode the given slab string lazily, yielding one instance at a time.
+        Only the header and layouts are decoded up front, the instances are read from the decompressed data
+        as they are requested and are not stored, this slab is not changed.
+
+        Args:
+            slab_str: The slab string as copied from TaleSpire, or any buffer-protocol object containing it.
+
+        Returns:
+            Iterator: An iterator of (uuid, pos_x, pos_y, pos_z, degrees) tuples.
+
+        Raises:
+            BadSlabCode: If the code is corrupt or has fewer instances than its layouts declare.
+        """
+        # A separate slab reads the header so a slab already decoded into this one is left as it is.
+        reader = TSSlab()
+        try:
+            reader._code = _code_buffer(slab_str)
+            reader._load_code()
+            reader._decode_header()  # Decoded before iterating so a bad slab code raises right away.
+        except (ValueError, struct.error) as e:
+            raise BadSlabCode(f"Failed to read the slab code, corrupt code or not a TS Slab Code: {e}") from e
+
+        instance_count = sum(reader._layout_counts)
+        if len(reader._binary_data) - reader._offset < instance_count * reader._instance_size():
+            raise BadSlabCode(f"The slab code ended early, the layouts declare {instance_count} instances.")
+        layouts = [(layout.uuid, count) for layout, count in zip(reader.layouts, reader._layout_counts)]
+        return _iter_instances(reader._binary_data, reader._offset, reader._version, layouts)
 
     def _decompress_data(self) -> None:
         """Unzip the Data."""
         try:
-            self._binary_data = gzip.decompress(self._binary_data)
-        except gzip.BadGzipFile:
+            self._binary_data = memoryview(gzip.decompress(self._binary_data))
+        except (gzip.BadGzipFile, EOFError, zlib.error):
             raise BadSlabCode("Failed to decompress the slab code, corrupt code or not a TS Slab Code.")
 
-    def _decode_magic_number(self) -> None:
-        """Unpack and verify the magic number."""
-        self.data["magic_num"] = self._unpack_u32()
+    def _verify_magic_number(self, magic_num: int) -> None:
+        """Store and verify the magic number."""
+        self._header["magic_num"] = magic_num
 
-        if self.data["magic_num"] != SLAB_MAGIC_NUM:
+        if magic_num != SLAB_MAGIC_NUM:
             raise BadSlabCode(f"Not a TaleSpire Slab!\n"
-                              f"\tGot Magic Number: {self.data['magic_num']}\n"
+                              f"\tGot Magic Number: {magic_num}\n"
                               f"\tInstead of: {SLAB_MAGIC_NUM}")
 
-    def _decode_version(self) -> None:
-        """Unpack and verify the slab version."""
-        self._version = self._unpack_u16()  # Unpack the version of the slab so we know which schema to use.
-        self.data["version"] = self._version
+    def _verify_version(self, version: int) -> None:
+        """Store and verify the slab version."""
+        self._version = version  # The version of the slab so we know which schema to use.
+        self._header["version"] = self._version
         if self._version not in SLAB_VERSIONS:
             raise UnsupportedSlabVersion(f"Version ({self._version}) is not supported, "
                                          f"valid slab versions are [{', '.join(str(x) for x in SLAB_VERSIONS)}]")
 
     def _decode_layouts(self) -> None:
-        """Unpack all of the UUID layouts."""
+        """Unpack all of the UUID layouts, the instance count of each layout is stored in `self._layout_counts`."""
+        self._layout_counts = []
         for n in range(self._layout_count):
-            uuid = self._unpack_slab_uuid()
-            asset_count = self._unpack_u16()
-            reserved = self._unpack_u16()
-            self.data["layouts"].append(
-                {
-                    "uuid": uuid,
-                    "instance_count": asset_count,
-                    "reserved": reserved,
-                    "instances": []
-                }
-            )
+            layout = self._unpack_record(_SLAB_LAYOUT)
+            self.layouts.append(TSSlabLayout(layout["uuid"], layout["reserved"]))
+            self._layout_counts.append(layout["instance_count"])
 
     def _decode_instances_v1(self) -> None:
         """Decode the v1 slab format Instances."""
-        for asset in self.data["layouts"]:
-            for n in range(asset["instance_count"]):
-                pos = struct.unpack_from("<3f", self._binary_data, self._offset)  # 3 floats
-                self._offset += 12
-
-                size = struct.unpack_from("<3f", self._binary_data, self._offset)  # 3 floats
-                self._offset += 12
-
-                rot = self._unpack_u8()
-
-                self._offset += 3  # For ignored data
-
-                instance_data = {
-                    "pos_x": pos[0],
-                    "pos_y": pos[1],
-                    "pos_z": pos[2],
-                    "size_x": size[0],
-                    "size_y": size[1],
-                    "size_z": size[2],
-                    "degrees": rot * 22.5
-                }
-                asset["instances"].append(instance_data)
+        for layout, count in zip(self.layouts, self._layout_counts):
+            end = self._offset + count * _V1_INSTANCE.size
+            if end > len(self._binary_data):  # A slice past the end would only come back shorter.
+                raise struct.error(f"v1 instances require a buffer of at least {end} bytes")
+            records = list(_V1_INSTANCE.iter_unpack(self._binary_data[self._offset:end]))
+            self._offset = end
+
+            layout.pos_x.extend(record[0] for record in records)
+            layout.pos_y.extend(record[1] for record in records)
+            layout.pos_z.extend(record[2] for record in records)
+            layout.size_x.extend(record[3] for record in records)
+            layout.size_y.extend(record[4] for record in records)
+            layout.size_z.extend(record[5] for record in records)
+            layout.degrees.extend(record[6] * 22.5 for record in records)
 
     def _decode_instances_v2(self) -> None:
         """Decode the v2 slab format instances."""
-        for asset in self.data["layouts"]:
-            for n in range(asset["instance_count"]):
-                packed_transform = self._unpack_u64()
-                unused = (packed_transform >> 59) & 0b11111
-                rot = (packed_transform >> 54) & 0b11111
-                pos_z = (packed_transform >> 36) & 0x3FFFF
-                pos_y = (packed_transform >> 18) & 0x3FFFF
-                pos_x = packed_transform & 0x3FFFF
-                instance_data = {
-                    "degrees": rot * 15.0,
-                    "pos_x": pos_x / 100.0,
-                    "pos_y": pos_y / 100.0,
-                    "pos_z": pos_z / 100.0
-                }
-                asset["instances"].append(instance_data)
+        for layout, count in zip(self.layouts, self._layout_counts):
+            packed_transforms = struct.unpack_from(f"<{count}Q", self._binary_data, self._offset)
+            self._offset += count * 8
+            # Bits 59-63 are unused.
+            layout.degrees.extend(((packed >> 54) & 0b11111) * 15.0 for packed in packed_transforms)
+            layout.pos_z.extend(((packed >> 36) & 0x3FFFF) / 100.0 for packed in packed_transforms)
+            layout.pos_y.extend(((packed >> 18) & 0x3FFFF) / 100.0 for packed in packed_transforms)
+            layout.pos_x.extend((packed & 0x3FFFF) / 100.0 for packed in packed_transforms)
+
+    def _decode_instances_v1_numpy(self) -> None:
+        """Decode the v1 slab format instances with NumPy, all the instances are read in a single view."""
+        total = sum(self._layout_counts)
+        records = np.frombuffer(self._binary_data, dtype=_V1_INSTANCE_DTYPE, count=total, offset=self._offset)
+        self._offset += records.nbytes
+
+        # float32 to float64 is exact, which matches what struct.unpack_from returns.
+        pos = records["pos"].astype(np.float64).T.copy()
+        size = records["size"].astype(np.float64).T.copy()
+        degrees = records["rot"] * 22.5
+
+        start = 0
+        for layout, count in zip(self.layouts, self._layout_counts):
+            end = start + count
+            _extend_column(layout.pos_x, pos[0, start:end])
+            _extend_column(layout.pos_y, pos[1, start:end])
+            _extend_column(layout.pos_z, pos[2, start:end])
+            _extend_column(layout.size_x, size[0, start:end])
+            _extend_column(layout.size_y, size[1, start:end])
+            _extend_column(layout.size_z, size[2, start:end])
+            _extend_column(layout.degrees, degrees[start:end])
+            start = end
 
-    def encode_slab(self, force_version: int | None = None, ignore_limit: bool = False) -> str:
+    def _decode_instances_v2_numpy(self) -> None:
+        """Decode the v2 slab format instances with NumPy, all the packed transforms are read in a single view."""
+        total = sum(self._layout_counts)
+        packed = np.frombuffer(self._binary_data, dtype="<u8", count=total, offset=self._offset)
+        self._offset += packed.nbytes
+
+        degrees = ((packed >> 54) & 0b11111).astype(np.float64) * 15.0
+        pos_z = ((packed >> 36) & 0x3FFFF).astype(np.float64) / 100.0
+        pos_y = ((packed >> 18) & 0x3FFFF).astype(np.float64) / 100.0
+        pos_x = (packed & 0x3FFFF).astype(np.float64) / 100.0
+
+        start = 0
+        for layout, count in zip(self.layouts, self._layout_counts):
+            end = start + count
+            _extend_column(layout.degrees, degrees[start:end])
+            _extend_column(layout.pos_x, pos_x[start:end])
+            _extend_column(layout.pos_y, pos_y[start:end])
+            _extend_column(layout.pos_z, pos_z[start:end])
+            start = end
+
+    def encode_slab(self, force_version: int | None = None, ignore_limit: bool = False,
+                    compression: str | int = "max", sort_instances: bool = False) -> str:
         """
         Triggers the encoding process and returns the results as an ascii string.
 
         Args:
             force_version: Forces encoding to a specific version schema (1,2)
             ignore_limit: Set to True to ignore the 30kB TaleSpire limit.
+            compression: The compression profile ("fast", "default", "max") or a gzip compression level (0-9).
+                The limit is always checked against the "max" size, a faster profile only gives a preview code
+                that can be larger than the limit when the slab still fits at "max".
+            sort_instances: Reorder the instances within each layout so similar transforms are stored together,
+                this usually makes the slab smaller. Only used by v2 slabs.
 
         Returns:
             str: The encoded slab string ready to paste into TaleSpire
         """
+        return self.encode_slab_with_size(force_version, ignore_limit, compression, sort_instances)[0]
+
+    def encode_slab_with_size(self, force_version: int | None = None, ignore_limit: bool = False,
+                              compression: str | int = "max", sort_instances: bool = False) -> tuple[str, int]:
+        """
+        The same as `encode_slab` but the compressed size is returned with the slab string.
+        Use the "fast" compression profile to quickly preview a slab or estimate its size.
+
+        Args:
+            force_version: Forces encoding to a specific version schema (1,2)
+            ignore_limit: Set to True to ignore the 30kB TaleSpire limit.
+            compression: The compression profile ("fast", "default", "max") or a gzip compression level (0-9).
+                The limit is always checked against the "max" size, a faster profile only gives a preview code
+                that can be larger than the limit when the slab still fits at "max".
+            sort_instances: Reorder the instances within each layout so similar transforms are stored together,
+                this usually makes the slab smaller. Only used by v2 slabs.
+
+        Returns:
+            tuple: The encoded slab string and the compressed size in bytes.
+        """
         if force_version:
             self._force_version = force_version
-        self._encode()
-        if len(self._binary_data) > SLAB_SIZE_LIMIT and not ignore_limit:
+        self._compression_level = _compression_level(compression)
+        self._sort_instances = sort_instances
+        self._sync_columns()
+        self._version = self._force_version or self._header["version"]
+
+        state_key = _state_key(self._header, self.layouts)
+        settings = (self._version, self._compression_level, self._sort_instances)
+        if self._encoded is not None and self._encoded[:2] == (state_key, settings):
+            self._binary_data = self._encoded[2]
+            self._code = base64.b64encode(self._binary_data)
+        else:
+            self._encode()
+            self._encoded = (state_key, settings, self._binary_data)
+        if len(self._binary_data) > SLAB_SIZE_LIMIT and not ignore_limit and not self._fits_at_max():
             raise SlabExceedsSizeLimit("Slab exceeds TaleSpire size limit of 30kB (30720 bytes) binary data!")
-        return self._code.decode("ascii")
+        return self._code.decode("ascii"), len(self._binary_data)
+
+    def _fits_at_max(self) -> bool:
+        """True if the encoded slab would fit the size limit at the "max" compression profile."""
+        max_level = COMPRESSION_PROFILES["max"]
+        if self._compression_level >= max_level:
+            return False
+        data = gzip.compress(gzip.decompress(self._binary_data), compresslevel=max_level)
+        return len(data) <= SLAB_SIZE_LIMIT
 
     def _encode_steps(self) -> None:
         """
@@ -177,82 +857,1085 @@ class TSSlab(TSCodingBase):
         Each step is broken down to a single line or method for ease of debugging and updating the schema.
         After this is run the entire slab should be encoded and stored in `self.binary_data`.
         """
-        self._pack_u32(self.data["magic_num"])
-        if self._force_version:
-            self._version = self._force_version
-        else:
-            self._version = self.data["version"]
-
-        self._pack_u16(self._version)
-        self._pack_u16(self.data["layout_count"])
-
-        if self._version > 1:
-            self._pack_u16(self.data["num_creatures"])
+        self._pack_record(_SLAB_PREAMBLE, {"magic_num": self._header["magic_num"], "version": self._version})
+        counts = {"layout_count": len(self.layouts), "num_creatures": self._header["num_creatures"]}
+        self._pack_record(_SLAB_COUNTS_V1 if self._version == 1 else _SLAB_COUNTS_V2, counts)
 
         self._encode_layouts()
+        self._encode_instances()
+
+        self._binary_data = gzip.compress(self._binary_data, compresslevel=self._compression_level)
 
+    def _binary_size(self) -> int:
+        """The exact size in bytes of the uncompressed slab, this is used to allocate the binary data once."""
+        instance_count = sum(len(layout) for layout in self.layouts)
         if self._version == 1:
-            self._encode_instances_v1()
+            header_size = _SLAB_PREAMBLE.size + _SLAB_COUNTS_V1.size
+            instance_size = _V1_INSTANCE.size
         else:
-            self._encode_instances_v2()
-
-        self._binary_data = gzip.compress(self._binary_data, compresslevel=9)
+            header_size = _SLAB_PREAMBLE.size + _SLAB_COUNTS_V2.size
+            instance_size = 8
+        return header_size + _SLAB_LAYOUT.size * len(self.layouts) + instance_size * instance_count
 
     def _encode_layouts(self) -> None:
         """Encode the UUID Layouts."""
-        for layout in self.data["layouts"]:
-            uuid_str = layout["uuid"]
-            if "reserved" in layout.keys():
-                reserved = layout["reserved"]
-            else:
-                reserved = 0
-            instance_count = len(layout["instances"])
-            self._pack_slab_uuid(uuid_str)
-            self._pack_u16(instance_count)
-            self._pack_u16(reserved)
-
-    def _encode_instances_v1(self) -> None:
-        """Encode the v1 slab format instances."""
-        for asset in self.data["layouts"]:
-            for data in asset["instances"]:
-                pos = (data["pos_x"], data["pos_y"], data["pos_z"])
-                size = (data["size_x"], data["size_y"], data["size_z"])
-                rot = int(data["degrees"]/22.5)
-
-                self._binary_data.extend(struct.pack("<3f", *pos))
-                self._binary_data.extend(struct.pack("<3f", *size))
-                self._pack_u8(rot)
-                self._binary_data.extend(struct.pack("3x"))  # 3 bytes of empty data
-
-    def _encode_instances_v2(self) -> None:
-        """Encode the v2 slab format instances."""
-        offset_x = offset_y = offset_z = 0
-        if self.data["version"] == 1:
-            # Attempt to convert v1 slabs to v2 slabs
-            # This may not work
-            min_x = min_y = min_z = 0
-            for asset in self.data["layouts"]:
-                for data in asset["instances"]:
-                    min_x = min(min_x, data["pos_x"])
-                    min_y = min(min_y, data["pos_y"])
-                    min_z = min(min_z, data["pos_z"])
-            offset_x = abs(min_x)
-            offset_y = abs(min_y)
-            offset_z = abs(min_z)
-
-        for asset in self.data["layouts"]:
-            for data in asset["instances"]:
-                unused = 0
-                rot = int(data["degrees"] / 15) & 0b11111
-                pos_x = int((data["pos_x"] + offset_x) * 100) & 0x3FFFF
-                pos_y = int((data["pos_y"] + offset_y) * 100) & 0x3FFFF
-                pos_z = int((data["pos_z"] + offset_z) * 100) & 0x3FFFF
-
-                packed = (
-                    (unused << 59) |
-                    (rot << 54) |
-                    (pos_z << 36) |
-                    (pos_y << 18) |
-                    pos_x
+        for layout in self.layouts:
+            self._pack_record(
+                _SLAB_LAYOUT, {"uuid": layout.uuid, "instance_count": len(layout), "reserved": layout.reserved}
+            )
+
+    def _encode_instances(self) -> None:
+        """
+        Encode the instances of every layout.
+        The packed instances of each layout are cached by its digest, so a layout that has not changed since
+        the last encode is copied from the cache instead of being packed again.
+        """
+        # v1 slabs are only offset when they are encoded as v2.
+        pack_settings = (self._version, self._v1_offset() if self._version == 2 else (0, 0, 0), self._sort_instances)
+        keys = [(layout._cached_digest(), pack_settings) for layout in self.layouts]  # Hashed by the state key.
+        cache = {key: self._packed_cache[key] for key in keys if key in self._packed_cache}
+        changed = [n for n, key in enumerate(keys) if key not in cache]
+        if changed:
+            pack = self._pack_instances_v1 if self._version == 1 else self._pack_instances_v2
+            packed = pack([self.layouts[n] for n in changed])
+            cache.update(zip((keys[n] for n in changed), packed))
+
+        for key in keys:
+            self._pack_bytes(cache[key])
+        self._packed_cache = cache  # Only the current layouts are kept.
+
+    @staticmethod
+    def _pack_instances_v1(layouts: list[TSSlabLayout]) -> list[bytes]:
+        """Pack the instances of each layout in the v1 slab format."""
+        result = []
+        for layout in layouts:
+            if len(layout) and not layout.has_size:
+                raise ValueError(f"Layout {layout.uuid} has no instance sizes, it can not be encoded as a v1 slab.")
+            data = bytearray(_V1_INSTANCE.size * len(layout))
+            offset = 0
+            for x, y, z, sx, sy, sz, d in zip(
+                layout.pos_x, layout.pos_y, layout.pos_z, layout.size_x, layout.size_y, layout.size_z, layout.degrees
+            ):
+                _V1_INSTANCE.pack_into(data, offset, x, y, z, sx, sy, sz, int(d / 22.5))
+                offset += _V1_INSTANCE.size
+            result.append(bytes(data))
+        return result
+
+    def _pack_instances_v2(self, layouts: list[TSSlabLayout]) -> list[bytes]:
+        """Pack the instances of each layout in the v2 slab format."""
+        packed_layouts = self._packed_layouts(layouts)
+        if self.use_numpy:
+            packed_layouts = [np.frombuffer(packed, dtype=np.uint64) for packed in packed_layouts]
+            if self._sort_instances:
+                packed_layouts = [np.sort(packed) for packed in packed_layouts]
+            return [packed.astype("<u8").tobytes() for packed in packed_layouts]
+
+        if self._sort_instances:
+            packed_layouts = [_sort_transforms(packed) for packed in packed_layouts]
+        return [struct.pack(f"<{len(packed)}Q", *packed) for packed in packed_layouts]
+
+    def _v1_offset(self) -> tuple[float, float, float]:
+        """
+        The offset needed to convert v1 slab positions to v2, this moves the minimum position to 0.
+        v2 positions can not be negative, this may not work for every v1 slab.
+        """
+        if self._header["version"] != 1:
+            return 0, 0, 0
+        min_x = min((min(layout.pos_x) for layout in self.layouts if len(layout)), default=0)
+        min_y = min((min(layout.pos_y) for layout in self.layouts if len(layout)), default=0)
+        min_z = min((min(layout.pos_z) for layout in self.layouts if len(layout)), default=0)
+        return abs(min(min_x, 0)), abs(min(min_y, 0)), abs(min(min_z, 0))
+
+    def translate(self, x: float = 0.0, y: float = 0.0, z: float = 0.0) -> None:
+        """
+        Move every instance.
+
+        Args:
+            x: The distance to move along X.
+            y: The distance to move along Y.
+            z: The distance to move along Z.
+
+        Raises:
+            SlabPositionOutOfRange: If a v2 slab would have positions outside of 0 - `SLAB_MAX_POSITION`,
+                or a v1 slab positions too large for a 32 bit float, the slab is left unchanged.
+        """
+        self._transform((1.0, 0.0, 0.0, 1.0), (x, y, z), 1.0, 0.0)
+
+    def rotate(self, steps: int, center: tuple[float, float] | None = None) -> None:
+        """
+        Rotate every instance about the Y axis in 15 degree steps, the positions and the rotations are updated.
+        Positive steps turn +Z towards +X, the same direction the instance rotation (degrees) turns.
+
+        Args:
+            steps: The number of 15 degree steps to rotate by, negative steps rotate the other way.
+                v1 slabs store rotations in 22.5 degree steps, so they can only be rotated in multiples of 3 steps.
+            center: The (x, z) point to rotate about, defaults to the center of the instance positions.
+
+        Raises:
+            SlabPositionOutOfRange: If a v2 slab would have positions outside of 0 - `SLAB_MAX_POSITION`,
+                or a v1 slab positions too large for a 32 bit float, the slab is left unchanged.
+            ValueError: If a v1 slab is rotated by steps that are not a multiple of 45 degrees.
+        """
+        self._sync_columns()
+        if self._header["version"] == 1 and steps % 3:
+            raise ValueError(f"Invalid v1 rotation: {steps} steps, v1 slabs store rotations in 22.5 degree steps "
+                             "and can only be rotated in multiples of 3 steps (45 degrees)")
+        center_x, center_z = center if center is not None else self._center()
+        angle = math.radians(steps * 15)
+        cos, sin = math.cos(angle), math.sin(angle)
+        if steps % 6 == 0:  # Multiples of 90 degrees are kept exact.
+            cos, sin = round(cos), round(sin)
+        self._transform(
+            (cos, sin, -sin, cos),
+            (center_x - cos * center_x - sin * center_z, 0.0, center_z + sin * center_x - cos * center_z),
+            1.0, steps * 15.0
+        )
+
+    def mirror(self, axis: str = "x", center: float | None = None) -> None:
+        """
+        Mirror the instance positions and rotations across a vertical plane.
+        The assets themselves are not mirrored, an asymmetric asset ends up facing the mirrored direction.
+
+        Args:
+            axis: "x" flips the X positions, "z" flips the Z positions.
+            center: The position of the plane on the axis, defaults to the center of the instance positions.
+
+        Raises:
+            SlabPositionOutOfRange: If a v2 slab would have positions outside of 0 - `SLAB_MAX_POSITION`,
+                or a v1 slab positions too large for a 32 bit float, the slab is left unchanged.
+        """
+        if axis not in ("x", "z"):
+            raise ValueError(f"Invalid mirror axis: {axis}, valid axes are x and z")
+        self._sync_columns()
+        center_x, center_z = self._center()
+        if axis == "x":
+            center = center_x if center is None else center
+            self._transform((-1.0, 0.0, 0.0, 1.0), (2.0 * center, 0.0, 0.0), -1.0, 0.0)
+        else:
+            center = center_z if center is None else center
+            self._transform((1.0, 0.0, 0.0, -1.0), (0.0, 0.0, 2.0 * center), -1.0, 180.0)
+
+    def merge(self, *slabs: TSSlab) -> None:
+        """
+        Add the instances of other slabs to this slab, layouts with the same UUID are folded into one layout.
+        The number of creatures is added up, the other slabs are not changed.
+
+        Args:
+            *slabs: The slabs to merge in, they must be the same version as this slab.
+        """
+        self._sync_columns()
+        layouts = {}
+        for layout in self.layouts:
+            target = layouts.setdefault(layout.uuid, layout)
+            if target is not layout:  # Layouts of this slab that repeat a UUID are folded too.
+                for name in ("pos_x", "pos_y", "pos_z", "degrees", "size_x", "size_y", "size_z"):
+                    getattr(target, name).extend(getattr(layout, name))
+        self.layouts = list(layouts.values())
+        for slab in slabs:
+            slab._sync_columns()
+            if slab._header["version"] != self._header["version"]:
+                raise UnsupportedSlabVersion(f"Can not merge a v{slab._header['version']} slab "
+                                             f"into a v{self._header['version']} slab.")
+            self._header["num_creatures"] += slab._header["num_creatures"]
+            for layout in slab.layouts:
+                target = layouts.get(layout.uuid)
+                if target is None:
+                    target = layouts[layout.uuid] = TSSlabLayout(layout.uuid, layout.reserved)
+                    self.layouts.append(target)
+                for name in ("pos_x", "pos_y", "pos_z", "degrees", "size_x", "size_y", "size_z"):
+                    getattr(target, name).extend(getattr(layout, name))
+        self._data = None
+
+    def remove_duplicates(self) -> int:
+        """
+        Remove instances that are identical to an earlier instance of the same layout.
+        Instances are compared by their v2 packed transform, the position to 0.01 and the rotation to 15 degrees,
+        so two instances are duplicates if they would encode the same. v1 instances must also have the same size.
+        Each layout is a single pass over a hash of its packed transforms.
+
+        Returns:
+            int: The number of instances removed.
+        """
+        removed = 0
+        for layout, packed in zip(self.layouts, self.packed_transforms()):
+            keys = zip(packed, layout.size_x, layout.size_y, layout.size_z) if layout.has_size else packed
+            keys = list(keys)
+            # Built from the end so each key keeps the index of its first instance.
+            first = dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+            if len(first) < len(keys):
+                removed += len(keys) - len(first)
+                layout.select(sorted(first.values()))
+        if removed:
+            self._data = None
+        return removed
+
+    def find_near_duplicates(self, distance: float = 0.05) -> list[tuple[str, int, int]]:
+        """
+        Find pairs of instances of the same layout that are positioned within a distance of each other,
+        whatever their rotation. Each layout is hashed into a grid of cells the size of the distance,
+        so only instances in neighbouring cells are compared.
+
+        Args:
+            distance: The largest distance between the positions of a pair.
+
+        Returns:
+            list: (layout uuid, instance index, instance index) tuples, the first index is the lower one.
+        """
+        if distance <= 0:
+            raise ValueError("The distance must be greater than 0.")
+        self._sync_columns()
+        floor = math.floor
+        distance_squared = distance * distance
+        pairs = []
+        for layout in self.layouts:
+            positions = list(zip(layout.pos_x, layout.pos_y, layout.pos_z))
+            cells = {}
+            for n, (x, y, z) in enumerate(positions):
+                cells.setdefault((floor(x / distance), floor(y / distance), floor(z / distance)), []).append(n)
+
+            layout_pairs = []
+            for (cell_x, cell_y, cell_z), entries in cells.items():
+                # Each pair of cells is checked once, from the cell that comes first.
+                for step_x, step_y, step_z in _NEIGHBOUR_STEPS:
+                    if step_x or step_y or step_z:
+                        others = cells.get((cell_x + step_x, cell_y + step_y, cell_z + step_z))
+                        if not others:
+                            continue
+                        candidates = ((a, b) for a in entries for b in others)
+                    else:
+                        candidates = ((a, b) for i, a in enumerate(entries) for b in entries[i + 1:])
+                    for a, b in candidates:
+                        ax, ay, az = positions[a]
+                        bx, by, bz = positions[b]
+                        if (ax - bx) ** 2 + (ay - by) ** 2 + (az - bz) ** 2 <= distance_squared:
+                            layout_pairs.append((a, b) if a < b else (b, a))
+            pairs.extend((layout.uuid, a, b) for a, b in sorted(layout_pairs))
+        return pairs
+
+    def _center(self) -> tuple[float, float]:
+        """The center of the bounding box of the instance positions on X and Z."""
+        xs = [value for layout in self.layouts if len(layout) for value in (min(layout.pos_x), max(layout.pos_x))]
+        zs = [value for layout in self.layouts if len(layout) for value in (min(layout.pos_z), max(layout.pos_z))]
+        if not xs:
+            return 0.0, 0.0
+        return (min(xs) + max(xs)) / 2.0, (min(zs) + max(zs)) / 2.0
+
+    def _transform(self, matrix: tuple[float, float, float, float], offset: tuple[float, float, float],
+                   degree_sign: float, degree_offset: float) -> None:
+        """
+        Apply a transform to every instance, all the new columns are computed and checked before any are changed.
+            x = matrix[0] * x + matrix[1] * z + offset[0]
+            y = y + offset[1]
+            z = matrix[2] * x + matrix[3] * z + offset[2]
+            degrees = (degree_sign * degrees + degree_offset) % 360
+        """
+        self._sync_columns()
+        if self.use_numpy:
+            columns = [_transform_columns_numpy(layout, matrix, offset, degree_sign, degree_offset)
+                       for layout in self.layouts]
+        else:
+            columns = [_transform_columns(layout, matrix, offset, degree_sign, degree_offset)
+                       for layout in self.layouts]
+
+        # v2 positions are 18 bit steps of 0.01 from 0, v1 positions are 32 bit floats.
+        if self._header["version"] == 1:
+            low_limit, high_limit, limits = -_FLOAT32_MAX, _FLOAT32_MAX, "a v1 slab can store"
+        else:
+            low_limit, high_limit, limits = -0.005, SLAB_MAX_POSITION + 0.005, f"0 - {SLAB_MAX_POSITION}"
+        for layout_columns in columns:
+            for column in layout_columns[:3]:
+                if not len(column):
+                    continue
+                low, high = (column.min(), column.max()) if self.use_numpy else (min(column), max(column))
+                if not (low_limit <= low and high < high_limit):  # Also true for NaN positions.
+                    raise SlabPositionOutOfRange(
+                        f"The transform moves instances outside of the slab positions {limits}"
+                    )
+
+        for layout, layout_columns in zip(self.layouts, columns):
+            for name, column in zip(("pos_x", "pos_y", "pos_z", "degrees"), layout_columns):
+                if self.use_numpy:
+                    layout.column(name)[:] = column
+                else:
+                    setattr(layout, name, column)
+        self._data = None
+
+    def apply_patch(self, patch: TSSlabPatch) -> None:
+        """
+        Apply a patch made by `diff_slabs`, this slab should be the same as the old slab of the diff.
+        The instances that are kept stay in their order, the added instances go at the end of the first layout
+        with their UUID and layouts that are new to the slab are added at the end. Layouts left empty by the patch
+        are removed.
+
+        Args:
+            patch: The patch to apply.
+
+        Raises:
+            SlabPatchConflict: If the patch removes an instance that is not in the slab, the slab is left unchanged.
+            UnsupportedSlabVersion: If the slab is not a v2 slab.
+        """
+        _check_patch_version(self)
+        layouts = {}
+        for layout in self.layouts:
+            layouts.setdefault(layout.uuid, layout)
+
+        # Every removal is matched before any layout is changed, across all the layouts that share a UUID.
+        targets = [layout for layout in self.layouts if layout.uuid in patch.removed]
+        remaining = {uuid: Counter(removed) for uuid, removed in patch.removed.items()}
+        kept = []
+        for layout, packed_transforms in zip(targets, self._packed_layouts(targets)):
+            counts = remaining[layout.uuid]
+            indices = []
+            for n, packed in enumerate(packed_transforms):
+                if counts[packed]:
+                    counts[packed] -= 1
+                else:
+                    indices.append(n)
+            kept.append((layout, indices))
+        for uuid, counts in remaining.items():
+            missing = sum(counts.values())
+            if missing:
+                raise SlabPatchConflict(f"The patch removes {missing} instances of {uuid} that are not in the slab.")
+
+        for layout, indices in kept:
+            layout.select(indices)
+        for uuid, added in patch.added.items():
+            layout = layouts.get(uuid)
+            if layout is None:
+                layout = layouts[uuid] = TSSlabLayout(uuid)
+                self.layouts.append(layout)
+            # Bits 59-63 are unused.
+            layout.degrees.extend(((packed >> 54) & 0b11111) * 15.0 for packed in added)
+            layout.pos_z.extend(((packed >> 36) & 0x3FFFF) / 100.0 for packed in added)
+            layout.pos_y.extend(((packed >> 18) & 0x3FFFF) / 100.0 for packed in added)
+            layout.pos_x.extend((packed & 0x3FFFF) / 100.0 for packed in added)
+
+        self.layouts = [layout for layout in self.layouts if len(layout) or layout.uuid not in patch.removed]
+        self._header["num_creatures"] = patch.num_creatures
+        self._data = None
+
+    def spatial_index(self, cell_size: float = 1.0) -> TSSlabSpatialIndex:
+        """
+        Build a spatial index of the instance positions for box, radius and point queries.
+        The index is a snapshot, build a new one after editing the slab.
+
+        Args:
+            cell_size: The size of a grid cell, see `TSSlabSpatialIndex`.
+        """
+        self._sync_columns()
+        return TSSlabSpatialIndex(self.layouts, cell_size)
+
+    def packed_transforms(self) -> list[array]:
+        """
+        Pack the instances of each layout into v2 packed transforms, exactly as they would be encoded.
+        v1 slabs are offset so the minimum position is at 0, the same as when they are encoded as v2.
+
+        Returns:
+            list: An `array.array("Q")` of packed transforms for each layout, in layout order.
+        """
+        self._sync_columns()
+        return self._packed_layouts(self.layouts)
+
+    def _packed_layouts(self, layouts: list[TSSlabLayout]) -> list[array]:
+        """The packed transforms of some of the layouts, the v1 offset is still found from every layout."""
+        if self.use_numpy:
+            return self._packed_layouts_numpy(layouts)
+
+        offset_x, offset_y, offset_z = self._v1_offset()
+        return [
+            array("Q", [
+                # Bits 59-63 are unused.
+                ((int(d / 15) & 0b11111) << 54) |
+                # Positions are rounded, truncating would turn a decoded 0.29 into 0.28.
+                ((round((z + offset_z) * 100) & 0x3FFFF) << 36) |
+                ((round((y + offset_y) * 100) & 0x3FFFF) << 18) |
+                (round((x + offset_x) * 100) & 0x3FFFF)
+                for d, x, y, z in zip(layout.degrees, layout.pos_x, layout.pos_y, layout.pos_z)
+            ])
+            for layout in layouts
+        ]
+
+    def _packed_layouts_numpy(self, layouts: list[TSSlabLayout]) -> list[array]:
+        """The NumPy version of `_packed_layouts`, the layouts are packed in one vectorized operation."""
+        result = [array("Q") for _ in layouts]
+        if not layouts:
+            return result
+        packed = _pack_transforms_v2(
+            np.concatenate([layout.column("degrees") for layout in layouts]),
+            np.concatenate([layout.column("pos_x") for layout in layouts]),
+            np.concatenate([layout.column("pos_y") for layout in layouts]),
+            np.concatenate([layout.column("pos_z") for layout in layouts]),
+            offset=self._v1_offset()
+        ).astype(np.uint64)  # Native byte order to match array("Q").
+
+        start = 0
+        for layout, layout_packed in zip(layouts, result):
+            end = start + len(layout)
+            _extend_column(layout_packed, packed[start:end])
+            start = end
+        return result
+
+    def encode_slab_split(self, size_limit: int = SLAB_SIZE_LIMIT,
+                          compression: str | int = "max") -> list[tuple[str, tuple[float, float, float]]]:
+        """
+        Encode the slab, splitting it into several slabs if it exceeds the size limit.
+
+        The instances are ordered along a Z-order (Morton) curve so each slab holds a spatially coherent
+        part of the build, then each slab is filled as far as an estimate of its compressed size allows.
+        The estimate comes from compressing the instances in blocks once, each slab is then checked with an actual
+        encode and adjusted if needed, so the full build is never re-compressed.
+        Each slab is moved so its minimum corner is at 0, the offset it was moved by is returned with it.
+        Split slabs are always encoded as v2 slabs.
+
+        Args:
+            size_limit: The size limit in bytes of each slab.
+            compression: The compression profile ("fast", "default", "max") or a gzip compression level (0-9).
+
+        Returns:
+            list: A list of (slab string, (offset_x, offset_y, offset_z)) tuples, paste each slab at its offset.
+        """
+        level = _compression_level(compression)
+        layout_packed = self.packed_transforms()
+        magic_num = self._header["magic_num"]
+        num_creatures = self._header["num_creatures"]
+
+        layouts = [
+            (layout.uuid, layout.reserved, packed) for layout, packed in zip(self.layouts, layout_packed)
+        ]
+        binary_data = gzip.compress(_build_slab_v2(magic_num, num_creatures, layouts), compresslevel=level)
+        if len(binary_data) <= size_limit:
+            return [(base64.b64encode(binary_data).decode("ascii"), (0.0, 0.0, 0.0))]
+
+        # Flatten the instances and order them along the Z-order curve.
+        instance_layouts = array("H")
+        packed = array("Q")
+        for n, layout_transforms in enumerate(layout_packed):
+            instance_layouts.extend([n] * len(layout_transforms))
+            packed.extend(layout_transforms)
+        keys = _morton_keys(packed)
+        order = sorted(range(len(packed)), key=keys.__getitem__)
+        instance_layouts = [instance_layouts[n] for n in order]
+        packed = [packed[n] for n in order]
+
+        estimates = _estimate_instance_sizes(packed, level)
+        slabs = []
+        start = 0
+        while start < len(packed):
+            end, binary_data, offset = _fit_slab(
+                self.layouts, magic_num, num_creatures if not slabs else 0, instance_layouts, packed, estimates,
+                start, size_limit, level
+            )
+            slabs.append((base64.b64encode(binary_data).decode("ascii"), offset))
+            start = end
+        return slabs
+
+
+def decode_slabs(slab_strs: Iterable[str], workers: int | None = None, use_numpy: bool = False,
+                 chunksize: int | None = None) -> list[TSSlab | TSEncodingException]:
+    """
+    Decode many slab strings across a pool of worker processes.
+    A slab that fails to decode does not stop the batch, its exception is returned in its place.
+
+    Args:
+        slab_strs: The slab strings as copied from TaleSpire.
+        workers: The number of worker processes, defaults to the number of CPUs. 1 decodes in this process.
+        use_numpy: Use the vectorized NumPy code paths.
+        chunksize: The number of slab strings sent to a worker at a time.
+
+    Returns:
+        list: The decoded `TSSlab` or the raised exception for each slab string, in the same order.
+    """
+    return map_batch(partial(_decode_slab_item, use_numpy=use_numpy), slab_strs, workers, chunksize)
+
+
+class TSSlabPatch:
+    """
+    The instances removed from and added to a v2 slab, made by `diff_slabs` and applied with `TSSlab.apply_patch`.
+
+    Instances are identified by their v2 packed transform (see `TSSlab.packed_transforms`), `removed` and `added`
+    map an asset UUID to an `array.array("Q")` of packed transforms. A moved instance is removed from its old
+    transform and added at its new one. A patch only holds the changes, use `encode` for a compact code to send.
+    """
+
+    def __init__(self, num_creatures: int = 0):
+        """
+        Args:
+            num_creatures: The number of creatures of the new slab.
+        """
+        self.num_creatures = num_creatures
+        self.removed: dict[str, array] = {}
+        self.added: dict[str, array] = {}
+
+    def __len__(self) -> int:
+        """The number of instances removed and added."""
+        return sum(map(len, self.removed.values())) + sum(map(len, self.added.values()))
+
+    def encode(self, compression: str | int = "max") -> str:
+        """
+        Encode the patch to a gzipped, base64 string like a slab code.
+
+        Args:
+            compression: The compression profile ("fast", "default", "max") or a gzip compression level (0-9).
+        """
+        empty = array("Q")
+        uuids = list(dict.fromkeys([*self.removed, *self.added]))
+        header = {"magic_num": _PATCH_MAGIC_NUM, "num_creatures": self.num_creatures, "layout_count": len(uuids)}
+        parts = [_PATCH_HEADER.pack(header)]
+        for uuid in uuids:
+            removed, added = self.removed.get(uuid, empty), self.added.get(uuid, empty)
+            parts.append(_PATCH_LAYOUT.pack({"uuid": uuid, "removed_count": len(removed), "added_count": len(added)}))
+            parts.append(_little_endian(removed))
+            parts.append(_little_endian(added))
+        data = gzip.compress(b"".join(parts), compresslevel=_compression_level(compression))
+        return base64.b64encode(data).decode("ascii")
+
+    @classmethod
+    def decode(cls, patch_str: str | bytes | bytearray | memoryview) -> TSSlabPatch:
+        """
+        Decode a patch string made by `encode`.
+
+        Args:
+            patch_str: The patch string, this can be a string or any buffer-protocol object.
+
+        Raises:
+            BadSlabCode: If the string is not a slab patch.
+        """
+        try:
+            data = memoryview(gzip.decompress(base64.b64decode(_code_buffer(patch_str))))
+            header = _PATCH_HEADER.unpack_from(data)
+            if header["magic_num"] != _PATCH_MAGIC_NUM:
+                raise BadSlabCode("Failed to read the slab patch, the code is not a slab patch.")
+            patch = cls(header["num_creatures"])
+            offset = _PATCH_HEADER.size
+            for _ in range(header["layout_count"]):
+                layout = _PATCH_LAYOUT.unpack_from(data, offset)
+                offset += _PATCH_LAYOUT.size
+                for transforms, count in ((patch.removed, layout["removed_count"]),
+                                          (patch.added, layout["added_count"])):
+                    if offset + count * 8 > len(data):
+                        raise BadSlabCode("Failed to read the slab patch, the patch data ended early.")
+                    if count:
+                        transforms[layout["uuid"]] = _from_little_endian(data[offset:offset + count * 8])
+                    offset += count * 8
+        except (ValueError, struct.error, gzip.BadGzipFile, EOFError, zlib.error) as e:
+            raise BadSlabCode(f"Failed to read the slab patch, corrupt code or not a slab patch: {e}") from e
+        return patch
+
+
+def diff_slabs(old: TSSlab | str | bytes, new: TSSlab | str | bytes, use_numpy: bool = False) -> TSSlabPatch:
+    """
+    Find the instances removed from and added to a slab, for each asset UUID.
+    Each layout is compared as a multiset of its packed transforms with a hash table, so a diff takes close to
+    linear time. Layouts with the same digest on both sides are skipped without being packed.
+    Applying the patch to the old slab with `TSSlab.apply_patch` gives the instances of the new slab.
+
+    Args:
+        old: The slab to start from, a slab code or a decoded v2 slab.
+        new: The slab to end at, a slab code or a decoded v2 slab.
+        use_numpy: Decode slab codes and pack the transforms with NumPy.
+
+    Raises:
+        UnsupportedSlabVersion: If either slab is not a v2 slab.
+    """
+    old, new = _patch_slab(old, use_numpy), _patch_slab(new, use_numpy)
+    old_layouts, new_layouts = {}, {}
+    for slab, layouts in ((old, old_layouts), (new, new_layouts)):
+        for layout in slab.layouts:
+            layouts.setdefault(layout.uuid, []).append(layout)
+
+    digests = {}
+    for uuid in [*old_layouts, *new_layouts]:
+        if uuid not in digests:
+            digests[uuid] = [[layout._digest() for layout in layouts.get(uuid, ())]
+                             for layouts in (old_layouts, new_layouts)]
+    changed = [uuid for uuid, (old_digests, new_digests) in digests.items() if old_digests != new_digests]
+
+    old_counts, new_counts = _transform_counts(old, set(changed)), _transform_counts(new, set(changed))
+    patch = TSSlabPatch(new._header["num_creatures"])
+    for uuid in changed:
+        removed = old_counts[uuid] - new_counts[uuid]
+        added = new_counts[uuid] - old_counts[uuid]
+        # Sorted so the patch is the same every time and compresses well.
+        if removed:
+            patch.removed[uuid] = array("Q", sorted(removed.elements()))
+        if added:
+            patch.added[uuid] = array("Q", sorted(added.elements()))
+    return patch
+
+
+def _patch_slab(slab: TSSlab | str | bytes, use_numpy: bool) -> TSSlab:
+    """Decode a slab code for `diff_slabs`, decoded slabs are used as they are."""
+    if not isinstance(slab, TSSlab):
+        code, slab = slab, TSSlab(use_numpy=use_numpy)
+        slab.decode_slab(code)
+    _check_patch_version(slab)
+    return slab
+
+
+def _check_patch_version(slab: TSSlab) -> None:
+    """Sync the columns of the slab and check that it is a v2 slab, patches use v2 packed transforms."""
+    slab._sync_columns()
+    if slab._header["version"] != 2:
+        raise UnsupportedSlabVersion(f"Slab patches need v2 slabs, this is a v{slab._header['version']} slab. "
+                                     "Encode it with force_version=2 and decode it again first.")
+
+
+def _transform_counts(slab: TSSlab, uuids: set[str]) -> dict[str, Counter]:
+    """Count the packed transforms of the layouts of the given UUIDs, the layouts are packed in one call."""
+    layouts = [layout for layout in slab.layouts if layout.uuid in uuids]
+    counts = {uuid: Counter() for uuid in uuids}
+    for layout, packed_transforms in zip(layouts, slab._packed_layouts(layouts)):
+        counts[layout.uuid].update(packed_transforms)
+    return counts
+
+
+def _little_endian(packed_transforms: array) -> bytes:
+    """The bytes of an `array("Q")` in little-endian order."""
+    if sys.byteorder == "big":
+        packed_transforms = array("Q", packed_transforms)
+        packed_transforms.byteswap()
+    return packed_transforms.tobytes()
+
+
+def _from_little_endian(data) -> array:
+    """An `array("Q")` from little-endian bytes."""
+    packed_transforms = array("Q")
+    packed_transforms.frombytes(data)
+    if sys.byteorder == "big":
+        packed_transforms.byteswap()
+    return packed_transforms
+
+
+def _state_key(header: dict, layouts: list[TSSlabLayout], cached: bool = False) -> tuple:
+    """
+    Everything about a slab that is encoded, the layouts are represented by their digests.
+
+    Args:
+        header: The slab header.
+        layouts: The layouts of the slab.
+        cached: Use the digests of the layouts whose columns were not fetched since they were last hashed,
+            see `TSSlabLayout._cached_digest`.
+    """
+    return (
+        header["magic_num"], header["version"], header["num_creatures"],
+        tuple((layout.uuid, layout.reserved, layout._cached_digest() if cached else layout._digest())
+              for layout in layouts)
+    )
+
+
+class _DataEdits:
+    """Records if the `data` dictionary of a slab was edited since it was built or last synced with the layouts."""
+
+    def __init__(self):
+        self.edited = False
+
+
+class _TrackedDict(dict):
+    """A dictionary of `TSSlab.data`, the methods that change it mark its `_DataEdits` as edited."""
+    __slots__ = ("_edits",)
+
+    def __reduce__(self):
+        return _tracked, (_TrackedDict, dict(self), self._edits)
+
+
+class _TrackedList(list):
+    """A list of `TSSlab.data`, the methods that change it mark its `_DataEdits` as edited."""
+    __slots__ = ("_edits",)
+
+    def __reduce__(self):
+        return _tracked, (_TrackedList, list(self), self._edits)
+
+
+def _tracked(container_type: type, values, edits: _DataEdits):
+    """Build a `_TrackedDict` or `_TrackedList` of the values that records its edits in `edits`."""
+    container = container_type(values)
+    container._edits = edits
+    return container
+
+
+def _marks_edit(method: Callable) -> Callable:
+    """Wrap a method of a tracked container so calling it marks the data as edited."""
+    def edit(self, *args, **kwargs):
+        self._edits.edited = True
+        return method(self, *args, **kwargs)
+    return edit
+
+
+for _name in ("__setitem__", "__delitem__", "__ior__", "clear", "pop", "popitem", "setdefault", "update"):
+    setattr(_TrackedDict, _name, _marks_edit(getattr(dict, _name)))
+for _name in ("__setitem__", "__delitem__", "__iadd__", "__imul__", "append", "extend", "insert", "pop", "remove",
+              "clear", "sort", "reverse"):
+    setattr(_TrackedList, _name, _marks_edit(getattr(list, _name)))
+
+
+def _is_tracked(data, edits: _DataEdits) -> bool:
+    """True if every dictionary and list of a `data` dictionary records its edits in `edits`."""
+    def tracked(container) -> bool:
+        return getattr(container, "_edits", None) is edits
+
+    layouts = data.get("layouts") if tracked(data) else None
+    return tracked(layouts) and all(
+        tracked(layout) and tracked(layout.get("instances")) and all(map(tracked, layout["instances"]))
+        for layout in layouts
+    )
+
+
+def _decode_slab_item(slab_str: str, use_numpy: bool = False) -> TSSlab | TSEncodingException:
+    """Decode a single slab for `decode_slabs`, returning the exception if it fails."""
+    slab = TSSlab(use_numpy=use_numpy)
+    try:
+        slab.decode_slab(slab_str)
+    except (BadSlabCode, UnsupportedSlabVersion) as e:
+        return e
+    slab._binary_data = None  # Not needed once decoded, this keeps it from being sent back from the worker.
+    return slab
+
+
+def _compression_level(compression: str | int) -> int:
+    """
+    Get the gzip compression level of a compression profile.
+
+    Args:
+        compression: The compression profile ("fast", "default", "max") or a gzip compression level (0-9).
+    """
+    if isinstance(compression, int) and 0 <= compression <= 9:
+        return compression
+    if compression in COMPRESSION_PROFILES:
+        return COMPRESSION_PROFILES[compression]
+    raise ValueError(f"Invalid compression: {compression}\n"
+                     f"Valid profiles are: {list(COMPRESSION_PROFILES)} or a compression level from 0 to 9")
+
+
+def _build_slab_v2(magic_num: int, num_creatures: int, layouts: list[tuple[str, int, array]]) -> bytearray:
+    """
+    Build the uncompressed binary data of a v2 slab from packed transforms.
+
+    Args:
+        magic_num: The slab magic number.
+        num_creatures: The number of creatures.
+        layouts: A list of (uuid, reserved, packed transforms) tuples.
+    """
+    instance_count = sum(len(packed) for uuid, reserved, packed in layouts)
+    header_size = _SLAB_PREAMBLE.size + _SLAB_COUNTS_V2.size
+    offset = header_size + _SLAB_LAYOUT.size * len(layouts)
+    binary_data = bytearray(offset + instance_count * 8)
+
+    _SLAB_PREAMBLE.pack_into(binary_data, 0, {"magic_num": magic_num, "version": 2})
+    _SLAB_COUNTS_V2.pack_into(
+        binary_data, _SLAB_PREAMBLE.size, {"layout_count": len(layouts), "num_creatures": num_creatures}
+    )
+    layout_offset = header_size
+    for uuid, reserved, packed in layouts:
+        _SLAB_LAYOUT.pack_into(
+            binary_data, layout_offset, {"uuid": uuid, "instance_count": len(packed), "reserved": reserved}
+        )
+        layout_offset += _SLAB_LAYOUT.size
+        struct.pack_into(f"<{len(packed)}Q", binary_data, offset, *packed)
+        offset += len(packed) * 8
+    return binary_data
+
+
+# Spreads the bits of a byte so there are 2 zero bits between each bit, used to interleave Z-order keys.
+_MORTON_SPREAD = [sum(((n >> bit) & 1) << (bit * 3) for bit in range(8)) for n in range(256)]
+
+
+def _spread_bits(value: int) -> int:
+    """Spread the bits of an 18-bit value so there are 2 zero bits between each bit."""
+    return (
+        _MORTON_SPREAD[value & 0xFF] |
+        (_MORTON_SPREAD[(value >> 8) & 0xFF] << 24) |
+        (_MORTON_SPREAD[value >> 16] << 48)
+    )
+
+
+def _morton_keys(packed_transforms) -> list[int]:
+    """
+    Compute the Z-order (Morton) key of the x, y, z position of each packed transform.
+
+    Args:
+        packed_transforms: A sequence of v2 packed transforms.
+    """
+    return [
+        _spread_bits(packed & 0x3FFFF) |
+        (_spread_bits((packed >> 18) & 0x3FFFF) << 1) |
+        (_spread_bits((packed >> 36) & 0x3FFFF) << 2)
+        for packed in packed_transforms
+    ]
+
+
+def _sort_transforms(packed_transforms: array) -> array:
+    """
+    Sort packed transforms so similar transforms are stored next to each other, which helps gzip.
+    Sorting by the packed value groups the instances by rotation, then orders them by z, y and x,
+    so neighbouring values share their upper bytes. This compressed better than a Z-order (Morton) sort.
+
+    Args:
+        packed_transforms: The v2 packed transforms of a layout.
+    """
+    return array("Q", sorted(packed_transforms))
+
+
+def _estimate_instance_sizes(packed_transforms: list[int], level: int, block_size: int = 256) -> list[float]:
+    """
+    Estimate the compressed size of each instance, the instances are compressed in blocks and each instance
+    in a block is given an even share of the block's compressed size.
+
+    Args:
+        packed_transforms: The packed transforms in the order they will be split.
+        level: The compression level.
+        block_size: The number of instances compressed together.
+    """
+    estimates = []
+    for start in range(0, len(packed_transforms), block_size):
+        block = packed_transforms[start:start + block_size]
+        compressed_size = len(zlib.compress(struct.pack(f"<{len(block)}Q", *block), level))
+        estimates.extend([compressed_size / len(block)] * len(block))
+    return estimates
+
+
+def _fit_slab(layouts: list[TSSlabLayout], magic_num: int, num_creatures: int, instance_layouts: list[int],
+              packed: list[int], estimates: list[float], start: int, size_limit: int,
+              level: int) -> tuple[int, bytes, tuple[float, float, float]]:
+    """
+    Find the largest run of instances from `start` that fits in one slab, for `TSSlab.encode_slab_split`.
+
+    Returns:
+        tuple: The end index of the run, the compressed binary data and the offset of the slab.
+    """
+    # Fill the slab as far as the estimate allows, each new layout costs its 20 byte layout entry.
+    overhead = 40  # The gzip header and footer plus the slab header.
+    estimate = overhead
+    seen = set()
+    end = start
+    while end < len(packed):
+        cost = estimates[end] if instance_layouts[end] in seen else estimates[end] + _SLAB_LAYOUT.size
+        if estimate + cost > size_limit * 0.95 and end > start:
+            break
+        seen.add(instance_layouts[end])
+        estimate += cost
+        end += 1
+
+    # Check the estimate with an actual encode, shrinking or growing the run until it fits as well as it can.
+    fits = None  # The largest end known to fit and its result.
+    too_big = len(packed) + 1  # The smallest end known not to fit.
+    for _ in range(16):
+        binary_data, offset = _encode_run(
+            layouts, magic_num, num_creatures, instance_layouts, packed, start, end, level
+        )
+        if len(binary_data) <= size_limit:
+            fits = (end, binary_data, offset)
+            if end == len(packed) or len(binary_data) > size_limit * 0.97 or end + 1 >= too_big:
+                break
+            next_end = start + int((end - start) * size_limit * 0.98 / len(binary_data))
+            next_end = min(max(next_end, end + 1), too_big - 1, len(packed))
+        else:
+            too_big = end
+            if fits and fits[0] + 1 >= too_big:
+                break
+            next_end = start + int((end - start) * size_limit * 0.98 / len(binary_data))
+            next_end = max(min(next_end, end - 1), fits[0] + 1 if fits else start + 1)
+        end = next_end
+
+    if fits is None:
+        # Keep halving until it fits, this should only happen when the estimates are far off.
+        while fits is None:
+            end = start + max(1, (end - start) // 2)
+            binary_data, offset = _encode_run(
+                layouts, magic_num, num_creatures, instance_layouts, packed, start, end, level
+            )
+            if len(binary_data) <= size_limit or end == start + 1:
+                fits = (end, binary_data, offset)
+    return fits
+
+
+def _encode_run(layouts: list[TSSlabLayout], magic_num: int, num_creatures: int, instance_layouts: list[int],
+                packed: list[int], start: int, end: int, level: int) -> tuple[bytes, tuple[float, float, float]]:
+    """
+    Encode the instances from `start` to `end` as a compressed v2 slab, moved so the minimum corner is at 0.
+
+    Returns:
+        tuple: The compressed binary data and the offset of the slab.
+    """
+    run = packed[start:end]
+    min_x = min(transform & 0x3FFFF for transform in run)
+    min_y = min((transform >> 18) & 0x3FFFF for transform in run)
+    min_z = min((transform >> 36) & 0x3FFFF for transform in run)
+    # Every field is at least its minimum, so subtracting them all at once never borrows between fields.
+    shift = (min_z << 36) | (min_y << 18) | min_x
+
+    grouped = {}
+    for layout_index, transform in zip(instance_layouts[start:end], run):
+        grouped.setdefault(layout_index, array("Q")).append(transform - shift)
+    run_layouts = [
+        (layouts[layout_index].uuid, layouts[layout_index].reserved, grouped[layout_index])
+        for layout_index in sorted(grouped)
+    ]
+    binary_data = gzip.compress(_build_slab_v2(magic_num, num_creatures, run_layouts), compresslevel=level)
+    return binary_data, (min_x / 100.0, min_y / 100.0, min_z / 100.0)
+
+
+class _SlabPrefixReader:
+    """
+    Decodes and decompresses the start of a slab code, only as far as has been read.
+    The base64 code is decoded in chunks and fed to a gzip decompressor that stops at the requested size.
+    """
+
+    def __init__(self, code, chunk_size: int = 512):
+        """
+        Args:
+            code: The slab code as bytes or any buffer-protocol object.
+            chunk_size: The number of base64 characters decoded at a time.
+        """
+        self._code = memoryview(code).cast("B")
+        self._code_offset = 0
+        self._chunk_size = chunk_size
+        self._pending = b""  # Base64 characters that do not make up a full 4 character group yet.
+        self._decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)  # Expect a gzip header.
+        self._data = b""
+
+    def detach(self) -> None:
+        """Copy the part of the code that has not been read yet, so the reader no longer uses the caller's buffer."""
+        code = self._code
+        self._code = memoryview(code[self._code_offset:].tobytes())
+        self._code_offset = 0
+        code.release()
+
+    def read(self, size: int) -> bytes:
+        """
+        Decompress until at least `size` bytes are available.
+        When more data is needed at least as much as has been read so far is decompressed,
+        so reading further and further into the slab costs linear time.
+
+        Returns:
+            bytes: All the data decompressed so far, shorter than `size` if the slab data ended.
+        """
+        decompressor = self._decompressor
+        if len(self._data) >= size or decompressor.eof:
+            return self._data
+
+        target = max(size, 2 * len(self._data))
+        parts = [self._data]
+        length = len(self._data)
+        try:
+            while length < target and not decompressor.eof:
+                compressed = decompressor.unconsumed_tail or self._next_chunk()
+                if not compressed:
+                    break
+                part = decompressor.decompress(compressed, target - length)
+                parts.append(part)
+                length += len(part)
+        except zlib.error:
+            raise BadSlabCode("Failed to decompress the slab code, corrupt code or not a TS Slab Code.")
+        self._data = b"".join(parts)
+        return self._data
+
+    def _next_chunk(self) -> bytes:
+        """Decode the next chunk of the base64 code, returns empty bytes at the end of the code."""
+        while self._code_offset < len(self._code):
+            chunk = self._code[self._code_offset:self._code_offset + self._chunk_size].tobytes()
+            self._code_offset += self._chunk_size
+            self._chunk_size = min(self._chunk_size * 2, 1 << 16)  # Larger chunks the further the code is read.
+            # Characters outside of the base64 alphabet are ignored, the same as `base64.b64decode`.
+            encoded = self._pending + chunk.translate(None, _NON_BASE64)
+            end = len(encoded) - len(encoded) % 4
+            self._pending = encoded[end:]
+            if end:
+                return base64.b64decode(encoded[:end])
+        if self._pending:
+            raise ValueError("Incorrect padding in the slab code.")
+        return b""
+
+
+def _code_buffer(slab_str: str | bytes | bytearray | memoryview):
+    """Strings are encoded to ascii bytes, buffer-protocol objects are used as they are without copying."""
+    if isinstance(slab_str, str):
+        return slab_str.encode("ascii")
+    return slab_str
+
+
+def _transform_columns(layout: TSSlabLayout, matrix: tuple[float, float, float, float],
+                       offset: tuple[float, float, float], degree_sign: float, degree_offset: float) -> list[array]:
+    """Compute the transformed pos_x, pos_y, pos_z and degrees columns of a layout, see `TSSlab._transform`."""
+    xx, xz, zx, zz = matrix
+    offset_x, offset_y, offset_z = offset
+    return [
+        array("d", [xx * x + xz * z + offset_x for x, z in zip(layout.pos_x, layout.pos_z)]),
+        array("d", [y + offset_y for y in layout.pos_y]),
+        array("d", [zx * x + zz * z + offset_z for x, z in zip(layout.pos_x, layout.pos_z)]),
+        array("d", [(degree_sign * degrees + degree_offset) % 360.0 for degrees in layout.degrees]),
+    ]
+
+
+def _transform_columns_numpy(layout: TSSlabLayout, matrix: tuple[float, float, float, float],
+                             offset: tuple[float, float, float], degree_sign: float, degree_offset: float) -> list:
+    """The vectorized `_transform_columns`, the columns are returned as NumPy arrays."""
+    xx, xz, zx, zz = matrix
+    offset_x, offset_y, offset_z = offset
+    pos_x, pos_z = layout.column("pos_x"), layout.column("pos_z")
+    return [
+        xx * pos_x + xz * pos_z + offset_x,
+        layout.column("pos_y") + offset_y,
+        zx * pos_x + zz * pos_z + offset_z,
+        np.mod(degree_sign * layout.column("degrees") + degree_offset, 360.0),
+    ]
+
+
+def _extend_column(column: array, values) -> None:
+    """Extend a column with a contiguous float64 NumPy array without converting each value to a python float."""
+    column.frombytes(memoryview(values).cast("B"))
+
+
+def _pack_transforms_v2(degrees, pos_x, pos_y, pos_z, offset: tuple[float, float, float] = (0.0, 0.0, 0.0)):
+    """
+    Pack arrays of rotations and positions into an array of little-endian v2 packed transforms.
+    Rounding and masking match `TSSlab.packed_transforms` exactly.
+
+    Args:
+        degrees: Array of the yaw rotations in degrees.
+        pos_x: Array of the X positions.
+        pos_y: Array of the Y positions.
+        pos_z: Array of the Z positions.
+        offset: The (x, y, z) offset added to the positions, used when converting v1 slabs to v2.
+
+    Returns:
+        numpy.ndarray: The packed transforms as a "<u8" array.
+    """
+    offset_x, offset_y, offset_z = offset
+
+    rot = (degrees / 15).astype(np.int64) & 0b11111
+    # rint rounds half to even the same as round() does.
+    x = np.rint((pos_x + offset_x) * 100).astype(np.int64) & 0x3FFFF
+    y = np.rint((pos_y + offset_y) * 100).astype(np.int64) & 0x3FFFF
+    z = np.rint((pos_z + offset_z) * 100).astype(np.int64) & 0x3FFFF
+
+    packed = (rot << 54) | (z << 36) | (y << 18) | x
+    return packed.astype("<u8")
+
+
+def _iter_instances(view: memoryview, offset: int, version: int,
+                    layouts: list[tuple[str, int]]) -> Iterator[tuple[str, float, float, float, float]]:
+    """
+    The generator behind `TSSlab.iter_instances`, this reads the instances directly from the decompressed data.
+
+    Args:
+        view: A view of the decompressed slab data.
+        offset: The offset of the first instance.
+        version: The slab version.
+        layouts: A list of (uuid, instance_count) tuples in the order they are stored.
+    """
+    for uuid, count in layouts:
+        if version == 1:
+            end = offset + count * _V1_INSTANCE.size
+            for record in _V1_INSTANCE.iter_unpack(view[offset:end]):
+                yield uuid, record[0], record[1], record[2], record[6] * 22.5
+        else:
+            end = offset + count * 8
+            for packed, in struct.iter_unpack("<Q", view[offset:end]):
+                yield (
+                    uuid,
+                    (packed & 0x3FFFF) / 100.0,
+                    ((packed >> 18) & 0x3FFFF) / 100.0,
+                    ((packed >> 36) & 0x3FFFF) / 100.0,
+                    ((packed >> 54) & 0b11111) * 15.0
                 )
-                self._pack_u64(packed)
+        offset = end
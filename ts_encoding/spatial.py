@@ -0,0 +1,149 @@
+"""
+Spatial queries over decoded slabs.
+
+The instances of a slab are hashed into a uniform grid of cubic cells, a query only visits the cells it overlaps
+instead of every instance of every layout. Build the index once with `TSSlab.spatial_index` and run as many
+queries against it as needed, the index does not follow later edits to the slab.
+"""
+from __future__ import annotations
+
+import math
+
+from array import array
+from typing import Iterable
+
+
+class TSSlabSpatialIndex:
+    """
+    A uniform grid hash over the instance positions of slab layouts.
+    Every query returns a list of (layout uuid, instance index) tuples in layout and instance order.
+    """
+
+    def __init__(self, layouts: Iterable, cell_size: float = 1.0):
+        """
+        Args:
+            layouts: The `TSSlabLayout` objects to index.
+            cell_size: The size of a grid cell, about the size of the queries works best.
+                The default of 1.0 is a single tile.
+        """
+        if cell_size <= 0:
+            raise ValueError("The cell size must be greater than 0.")
+        self.cell_size = cell_size
+        self.uuids = []
+        # The position, layout index and instance index of every entry.
+        self._pos_x = array("d")
+        self._pos_y = array("d")
+        self._pos_z = array("d")
+        self._layout_index = array("l")
+        self._instance_index = array("l")
+        self._cells: dict[tuple[int, int, int], list[int]] = {}
+
+        floor = math.floor
+        cells = self._cells
+        entry = 0
+        for layout_index, layout in enumerate(layouts):
+            self.uuids.append(layout.uuid)
+            self._pos_x.extend(layout.pos_x)
+            self._pos_y.extend(layout.pos_y)
+            self._pos_z.extend(layout.pos_z)
+            self._layout_index.extend([layout_index] * len(layout))
+            self._instance_index.extend(range(len(layout)))
+            for x, y, z in zip(layout.pos_x, layout.pos_y, layout.pos_z):
+                key = (floor(x / cell_size), floor(y / cell_size), floor(z / cell_size))
+                bucket = cells.get(key)
+                if bucket is None:
+                    cells[key] = [entry]
+                else:
+                    bucket.append(entry)
+                entry += 1
+
+        # The corners of the cells in use, query bounds are clamped to them so infinite bounds can be used.
+        if cells:
+            self._min_bound = [min(key[axis] for key in cells) * cell_size for axis in range(3)]
+            self._max_bound = [(max(key[axis] for key in cells) + 1) * cell_size for axis in range(3)]
+
+    def __len__(self) -> int:
+        return len(self._pos_x)
+
+    def query_box(self, min_corner: tuple[float, float, float],
+                  max_corner: tuple[float, float, float]) -> list[tuple[str, int]]:
+        """
+        Find the instances positioned inside a box, the box includes its faces.
+
+        Args:
+            min_corner: The (x, y, z) minimum corner of the box.
+            max_corner: The (x, y, z) maximum corner of the box.
+        """
+        min_x, min_y, min_z = min_corner
+        max_x, max_y, max_z = max_corner
+        pos_x, pos_y, pos_z = self._pos_x, self._pos_y, self._pos_z
+        entries = [
+            entry for entry in self._candidates(min_corner, max_corner)
+            if min_x <= pos_x[entry] <= max_x and min_y <= pos_y[entry] <= max_y and min_z <= pos_z[entry] <= max_z
+        ]
+        return self._results(entries)
+
+    def query_radius(self, center: tuple[float, float, float], radius: float) -> list[tuple[str, int]]:
+        """
+        Find the instances positioned within a distance of a point.
+
+        Args:
+            center: The (x, y, z) center of the sphere.
+            radius: The radius of the sphere, instances exactly on the surface are included.
+        """
+        x, y, z = center
+        radius_squared = radius * radius
+        pos_x, pos_y, pos_z = self._pos_x, self._pos_y, self._pos_z
+        candidates = self._candidates((x - radius, y - radius, z - radius), (x + radius, y + radius, z + radius))
+        entries = [
+            entry for entry in candidates
+            if (pos_x[entry] - x) ** 2 + (pos_y[entry] - y) ** 2 + (pos_z[entry] - z) ** 2 <= radius_squared
+        ]
+        return self._results(entries)
+
+    def query_point(self, point: tuple[float, float, float], tolerance: float = 0.005) -> list[tuple[str, int]]:
+        """
+        Find the instances positioned at a point, for example every asset placed on a tile.
+
+        Args:
+            point: The (x, y, z) position.
+            tolerance: How far each axis may be from the point, the default is half of the 0.01 position step
+                of v2 slabs.
+        """
+        x, y, z = point
+        min_corner = (x - tolerance, y - tolerance, z - tolerance)
+        return self.query_box(min_corner, (x + tolerance, y + tolerance, z + tolerance))
+
+    def _candidates(self, min_corner: tuple[float, float, float], max_corner: tuple[float, float, float]) -> list[int]:
+        """The entries in every cell the box overlaps, these still need to be checked against the query."""
+        cells = self._cells
+        if not cells:
+            return []
+        cell_size = self.cell_size
+        floor = math.floor
+        min_cell = [floor(max(value, bound) / cell_size) for value, bound in zip(min_corner, self._min_bound)]
+        max_cell = [floor(min(value, bound) / cell_size) for value, bound in zip(max_corner, self._max_bound)]
+        if any(low > high for low, high in zip(min_cell, max_cell)):
+            return []
+
+        cell_count = math.prod(high - low + 1 for low, high in zip(min_cell, max_cell))
+        candidates = []
+        if cell_count > len(cells):
+            # The box covers more cells than are used, check the used cells instead of every cell in the box.
+            for key, bucket in cells.items():
+                if all(low <= value <= high for value, low, high in zip(key, min_cell, max_cell)):
+                    candidates.extend(bucket)
+        else:
+            for cell_x in range(min_cell[0], max_cell[0] + 1):
+                for cell_y in range(min_cell[1], max_cell[1] + 1):
+                    for cell_z in range(min_cell[2], max_cell[2] + 1):
+                        bucket = cells.get((cell_x, cell_y, cell_z))
+                        if bucket:
+                            candidates.extend(bucket)
+        return candidates
+
+    def _results(self, entries: list[int]) -> list[tuple[str, int]]:
+        """Convert entries to sorted (layout uuid, instance index) tuples."""
+        entries.sort()  # Entries are numbered in layout and instance order.
+        uuids, layout_index, instance_index = self.uuids, self._layout_index, self._instance_index
+        return [(uuids[layout_index[entry]], instance_index[entry]) for entry in entries]